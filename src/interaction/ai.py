@@ -0,0 +1,306 @@
+from abc import ABC, abstractmethod
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from src.model.deck import *
+from src.model.models import GameModel, KlondikeModel
+from src.model.snapshot import pack_state, unpack_state
+
+if TYPE_CHECKING:
+    from src.interaction.views import KlondikeView
+
+
+class Controller:
+    def __init__(self, model: GameModel):
+        self._model = model
+        self._current_frame = 0
+
+    def update(self):
+        self._current_frame += 1
+
+    def teardown(self):
+        return
+
+
+class MoveScheduler:
+    # Works out how many moves an AI makes per update from its own clock rather than the frame counter: a fixed number
+    # each update, as many as fit in a time budget, or a fixed rate in real time. The view only sees the position after
+    # each update, so fast games render a sample of their moves
+    def __init__(self, moves_per_update: int = 1, moves_per_second: Optional[float] = None,
+                 time_budget: Optional[float] = None, max_backlog: float = 0.25):
+        self._moves_per_update = moves_per_update
+        self._moves_per_second = moves_per_second
+        self._time_budget = time_budget
+        # Seconds of moves a fixed rate may fall behind by and still catch up on, so a slow frame does not cause a burst
+        self._max_backlog = max_backlog
+        self._owed = 0.0
+        self._last_time: Optional[float] = None
+
+    def reset(self):
+        # Forgets the time since the last update, so a game coming out of a pause does not rush to catch up
+        self._owed = 0.0
+        self._last_time = None
+
+    def _num_due(self, now: float) -> int:
+        if self._moves_per_second is None:
+            return self._moves_per_update
+        if self._last_time is None:
+            self._owed = 1.0
+        else:
+            self._owed = min(self._owed + (now - self._last_time) * self._moves_per_second,
+                             max(1.0, self._max_backlog * self._moves_per_second))
+        self._last_time = now
+        num_due = int(self._owed)
+        self._owed -= num_due
+        return num_due
+
+    def run(self, step: Callable[[], bool]) -> int:
+        # Makes the moves due now, stopping early once step returns False, and returns how many were made
+        now = time.perf_counter()
+        num_due = None if self._time_budget is not None else self._num_due(now)
+        num_moves = 0
+        while num_due is None or num_moves < num_due:
+            if num_due is None and num_moves > 0 and time.perf_counter() - now >= self._time_budget:
+                break
+            if not step():
+                break
+            num_moves += 1
+        return num_moves
+
+
+class AIController(Controller, ABC):
+    def __init__(self, model: GameModel, wait_time: float = 0, scheduler: Optional[MoveScheduler] = None):
+        super().__init__(model)
+        if scheduler is None:
+            scheduler = MoveScheduler(moves_per_second=1 / wait_time) if wait_time > 0 else MoveScheduler()
+        self._scheduler = scheduler
+        self._paused = False
+
+    @property
+    def can_move(self) -> bool:
+        return not self._paused
+
+    def update(self):
+        super().update()
+        # Only games being watched are updated, so headless runs never have to load pygame
+        import pygame
+        from pygame import locals
+        for event in pygame.event.get(locals.KEYUP):
+            if event.key == locals.K_p:
+                self._paused = not self._paused
+                self._scheduler.reset()
+        if self.can_move:
+            self._scheduler.run(self._scheduled_step)
+
+    def _scheduled_step(self) -> bool:
+        return not self._model.is_done() and self.step()
+
+    def step(self) -> bool:
+        # Makes one move straight away, without polling events or waiting on frames
+        moved = self._move()
+        if not moved:
+            self._model.running = False
+        return moved
+
+    @abstractmethod
+    def _move(self) -> bool:
+        pass
+
+
+class KlondikeAIController(AIController):
+    def __init__(self, model: KlondikeModel, view: Optional['KlondikeView'] = None, verbose: bool = True,
+                 scheduler: Optional[MoveScheduler] = None):
+        super().__init__(model, scheduler=scheduler)
+        self._view = view
+        self._verbose = verbose
+        self._num_reshuffle_since_last_move = 0
+        # Positions seen since a card last went up; the AI only ever adds to the foundations and always plays the same
+        # move from the same position, so seeing one again means it is going round in circles
+        self._seen: Set[int] = set()
+        self._foundation_cards = 0
+        # Per tableau pile: (version, movable run top first, whether cards lie under the run, top card id or None)
+        self._summaries: Dict[int, Tuple[int, List[int], bool, Optional[int]]] = {}
+        # (source, dest) -> (source version, dest version, whether the AI would move between them)
+        self._stack_candidates: Dict[Tuple[int, int], Tuple[int, int, bool]] = {}
+        # tableau index -> (pile version, foundation version, whether its top card can go up)
+        self._foundation_candidates: Dict[int, Tuple[int, int, bool]] = {}
+
+    def _is_looping(self) -> bool:
+        if self._model.foundation.num_cards() != self._foundation_cards:
+            self._foundation_cards = self._model.foundation.num_cards()
+            self._seen.clear()
+        position = self._model.zobrist_hash
+        if position in self._seen:
+            return True
+        self._seen.add(position)
+        return False
+
+    def _game_over(self) -> bool:
+        if self._verbose:
+            print('No more moves')
+        return False
+
+    def _summary(self, pile_index: int) -> Tuple[int, List[int], bool, Optional[int]]:
+        version = self._model.pile_version('tableau', pile_index)
+        summary = self._summaries.get(pile_index)
+        if summary is None or summary[0] != version:
+            pile = self._model.tableau.peek_all(pile_index)
+            ids = pile.card_ids
+            run = pile.num_stackable_on_top(self._model.stacking_method)
+            summary = version, ids[len(ids) - run:][::-1], len(ids) > run, ids[-1] if len(ids) > 0 else None
+            self._summaries[pile_index] = summary
+        return summary
+
+    def _can_stack(self, src_index: int, dest_index: int) -> bool:
+        src_version, run, has_remaining, _ = self._summary(src_index)
+        dest_version, _, _, target = self._summary(dest_index)
+        cached = self._stack_candidates.get((src_index, dest_index))
+        if cached is not None and cached[0] == src_version and cached[1] == dest_version:
+            return cached[2]
+        can_stack = False
+        if len(run) > 0:
+            bottom = run[-1]
+            can_stack = any(self._model.stacking_method.can_stack(card, target) for card in run)\
+                and (has_remaining or CARD_RANKS[bottom] != Rank.KING)\
+                and (target is None or CARD_RANK_VALUES[target] > CARD_RANK_VALUES[bottom])
+        self._stack_candidates[src_index, dest_index] = src_version, dest_version, can_stack
+        return can_stack
+
+    def _can_go_up(self, pile_index: int) -> bool:
+        version = self._model.pile_version('tableau', pile_index)
+        foundation_version = self._model.pile_version('foundation')
+        cached = self._foundation_candidates.get(pile_index)
+        if cached is not None and cached[0] == version and cached[1] == foundation_version:
+            return cached[2]
+        top = self._model.tableau.peek_all(pile_index)
+        can_go_up = top.num_visible_on_top() > 0 and self._model.foundation.can_add_card(top[0])
+        self._foundation_candidates[pile_index] = version, foundation_version, can_go_up
+        return can_go_up
+
+    def _move(self):
+        if self._is_looping():
+            return self._game_over()
+
+        # Candidates are cached against the model's pile versions, so only piles that changed are looked at again
+        num_piles = self._model.tableau.num_piles
+        for src_index in range(num_piles):
+            for dest_index in range(num_piles):
+                if self._can_stack(src_index, dest_index):
+                    self._model.pickup('tableau', src_index)
+                    self._model.set_down_on('tableau', dest_index)
+                    self._num_reshuffle_since_last_move = 0
+                    return True
+
+        waste_card = self._model.draw_pile.peek_card()
+        if waste_card is not None:
+            for dest_index, dest in enumerate(self._model.tableau):
+                if waste_card.can_stack_on(dest, self._model.stacking_method):
+                    self._model.pickup('draw', 0)
+                    self._model.set_down_on('tableau', dest_index)
+                    self._num_reshuffle_since_last_move = 0
+                    return True
+
+        for tab_index in range(num_piles):
+            if self._can_go_up(tab_index) and self._model.on_select('tableau', tab_index):
+                self._num_reshuffle_since_last_move = 0
+                return True
+
+        if self._model.on_select('draw', 0):
+            self._num_reshuffle_since_last_move = 0
+            return True
+
+        if not self._model.can_play_from_stock():
+            # Nothing left on the board can move and no stock card will ever fit, so dealing would go on forever
+            return self._game_over()
+
+        if self._model.draw_pile.deck_length == 0:
+            if self._num_reshuffle_since_last_move == 2:
+                return self._game_over()
+            self._num_reshuffle_since_last_move += 1
+        self._model.on_select('deck', 0)
+        return True
+
+
+class BackgroundAIController(AIController):
+    # Lets another AI think in a worker thread on its own copy of the game, so a slow AI never holds up input or
+    # drawing. The worker starts from a snapshot of the current position and sends back a snapshot after each move it
+    # makes, which updates are then paced out by the scheduler. If the game is changed any other way, the worker and
+    # everything it had queued are dropped and a new one starts from the new position
+    def __init__(self, model: KlondikeModel, make_ai: Optional[Callable[[KlondikeModel], AIController]] = None,
+                 wait_time: float = 0, scheduler: Optional[MoveScheduler] = None, max_ahead: int = 256):
+        super().__init__(model, wait_time, scheduler)
+        self._make_ai = make_ai if make_ai is not None else lambda copy: KlondikeAIController(copy, verbose=False)
+        self._max_ahead = max_ahead
+        self._results: Optional[queue.Queue] = None
+        self._cancel: Optional[threading.Event] = None
+        # Hash of the position the last result left the game in, or None when no worker is running
+        self._expected: Optional[int] = None
+
+    @staticmethod
+    def _send(result: Union[bytes, Exception, None], results: queue.Queue, cancel: threading.Event):
+        while not cancel.is_set():
+            try:
+                results.put(result, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _think(self, record: bytes, results: queue.Queue, cancel: threading.Event):
+        # A snapshot of the position after each move, then None once the AI has no more moves. If the AI fails, the
+        # exception is sent instead so the main thread can raise it rather than wait forever
+        try:
+            model = unpack_state(record)
+            ai = self._make_ai(model)
+            moved = True
+            while moved and not cancel.is_set():
+                moved = ai.step()
+                self._send(pack_state(model) if moved else None, results, cancel)
+        except Exception as error:
+            self._send(error, results, cancel)
+
+    def _start_worker(self):
+        self.teardown()
+        self._results = queue.Queue(self._max_ahead)
+        self._cancel = threading.Event()
+        self._expected = self._model.zobrist_hash
+        threading.Thread(target=self._think, args=(pack_state(self._model), self._results, self._cancel),
+                         daemon=True).start()
+
+    def _apply(self, result: Union[bytes, Exception, None]) -> bool:
+        if isinstance(result, Exception):
+            self.teardown()
+            raise result
+        if result is None:
+            return False
+        unpack_state(result, self._model)
+        self._expected = self._model.zobrist_hash
+        return True
+
+    def _scheduled_step(self) -> bool:
+        # Takes a finished move if there is one, without waiting on the worker
+        if self._model.is_done() or self._model.selected is not None:
+            return False
+        if self._expected != self._model.zobrist_hash:
+            self._start_worker()
+        try:
+            result = self._results.get_nowait()
+        except queue.Empty:
+            return False
+        if not self._apply(result):
+            self._model.running = False
+            return False
+        return True
+
+    def _move(self) -> bool:
+        if self._expected != self._model.zobrist_hash:
+            self._start_worker()
+        return self._apply(self._results.get())
+
+    def teardown(self):
+        if self._cancel is not None:
+            self._cancel.set()
+        self._results = None
+        self._cancel = None
+        self._expected = None
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 import pygame
 
 from src.model.board import *
@@ -18,30 +19,59 @@ class Sprite(pygame.Surface, ABC):
         pass
 
 
+class CardAtlas:
+    # Every card face and the card back, rendered once so that drawing a card is a single blit
+    def __init__(self):
+        self._faces = [self._render(card, True) for card in CARDS]
+        self._back = self._render(CARDS[0], False)
+
+    @staticmethod
+    def _render(card: Card, is_visible: bool) -> pygame.Surface:
+        surface = pygame.Surface(constants.CARD_SIZE, pygame.SRCALPHA)
+        rect = surface.get_rect()
+        pygame.draw.rect(surface, constants.CARD_COLOR, rect, border_radius=constants.CARD_RADIUS)
+        if is_visible:
+            text = f'{card}'
+            color = constants.BLACK if card.is_black else constants.RED
+            large_text = constants.LARGE_TEXT.render(text, True, color)
+            small_text = constants.SMALL_TEXT.render(text, True, color)
+            small_text_rot = pygame.transform.rotate(small_text, 180)
+            surface.blit(large_text, large_text.get_rect(centerx=rect.centerx - 3, centery=rect.centery - 3))
+            surface.blit(small_text, small_text.get_rect(topleft=(0, 0)))
+            surface.blit(small_text_rot, small_text_rot.get_rect(bottomright=rect.bottomright))
+        else:
+            pygame.draw.rect(surface, constants.CARD_BACK, (5, 5, constants.CARD_SIZE[0] - 10,
+                                                            constants.CARD_SIZE[1] - 10),
+                             border_radius=int(constants.CARD_RADIUS / 2))
+        pygame.draw.rect(surface, (0, 0, 0), rect, width=1, border_radius=constants.CARD_RADIUS)
+        # Matching the display's pixel format makes the blits cheaper, but needs a display to exist
+        return surface if pygame.display.get_surface() is None else surface.convert_alpha()
+
+    def get(self, card: Card, is_visible: bool = True) -> pygame.Surface:
+        return self._faces[card.id] if is_visible else self._back
+
+
+_card_atlas: Optional[CardAtlas] = None
+
+
+def card_atlas() -> CardAtlas:
+    # Built on first use, since rendering text needs pygame's fonts to be set up
+    global _card_atlas
+    if _card_atlas is None:
+        _card_atlas = CardAtlas()
+    return _card_atlas
+
+
 class CardSprite(Sprite):
     def __init__(self, card: Card, is_visible: bool = True):
         super().__init__(constants.CARD_SIZE)
         self._card = card
         self._is_visible = is_visible
-        self._rect = self.get_rect()
         self.draw()
 
     def draw(self):
-        pygame.draw.rect(self, constants.CARD_COLOR, self._rect, border_radius=constants.CARD_RADIUS)
-        if self._is_visible:
-            text = f'{self._card}'
-            color = constants.BLACK if self._card.is_black else constants.RED
-            large_text = constants.LARGE_TEXT.render(text, True, color)
-            small_text = constants.SMALL_TEXT.render(text, True, color)
-            small_text_rot = pygame.transform.rotate(small_text, 180)
-            self.blit(large_text, large_text.get_rect(centerx=self._rect.centerx - 3, centery=self._rect.centery - 3))
-            self.blit(small_text, small_text.get_rect(topleft=(0, 0)))
-            self.blit(small_text_rot, small_text_rot.get_rect(bottomright=self._rect.bottomright))
-        else:
-            pygame.draw.rect(self, constants.CARD_BACK, (5, 5, constants.CARD_SIZE[0] - 10,
-                                                         constants.CARD_SIZE[1] - 10),
-                             border_radius=int(constants.CARD_RADIUS / 2))
-        pygame.draw.rect(self, (0, 0, 0), self._rect, width=1, border_radius=constants.CARD_RADIUS)
+        self.fill((0, 0, 0, 0))
+        self.blit(card_atlas().get(self._card, self._is_visible), (0, 0))
 
 
 class PileSprite(Sprite):
@@ -70,28 +100,84 @@ class PileSprite(Sprite):
         increasing = sum(list(self._direction.value)) > 0
         pos = (0, 0) if increasing else\
             (self.get_size()[0] - constants.CARD_SIZE[0], self.get_size()[1] - constants.CARD_SIZE[1])
+        atlas = card_atlas()
         for card_index in range(self._num_cards_shown - 1, -1, -1):
-            self.blit(CardSprite(self._pile[card_index], self._pile.is_visible(card_index)), pos)
+            self.blit(atlas.get(self._pile[card_index], self._pile.is_visible(card_index)), pos)
             pos = (pos[0] + constants.NONOVERLAP_DIST * self._direction.value[0],
                    pos[1] + constants.NONOVERLAP_DIST * self._direction.value[1])
 
 
+class PileSpriteCache:
+    # Rendered piles keyed on what they show, so a pile going back to an earlier state (an undo, or the waste coming
+    # round again) is not drawn again. The least recently used are evicted once full
+    def __init__(self, max_size: int = 64):
+        self._max_size = max_size
+        self._sprites: 'OrderedDict[tuple, PileSprite]' = OrderedDict()
+
+    def get(self, pile: Pile, direction: PileSprite.StackDirection = PileSprite.StackDirection.DOWN,
+            show_hidden: bool = True, max_shown: int = 0) -> PileSprite:
+        key = pile.state_key, direction, show_hidden, max_shown
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = PileSprite(pile, direction, show_hidden, max_shown)
+            self._sprites[key] = sprite
+            if len(self._sprites) > self._max_size:
+                self._sprites.popitem(last=False)
+        else:
+            self._sprites.move_to_end(key)
+        return sprite
+
+    def clear(self):
+        self._sprites.clear()
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+
 class MultiPileSprite(Sprite, ABC):
-    def __init__(self, size: Tuple[int, int]):
+    def __init__(self, size: Tuple[int, int], cache_size: int = 64):
         super().__init__(size)
+        self._cache = PileSpriteCache(cache_size)
         self._piles: List[PileSprite] = []
         self._pile_rects: List[pygame.rect.Rect] = []
+        self._pile_versions: List[int] = []
         self.draw()
 
+    @property
     @abstractmethod
-    def _update_sprites(self):
+    def num_piles(self) -> int:
         pass
 
-    def draw(self):
-        self._update_sprites()
-        self.fill((0, 0, 0, 0))
-        for index in range(len(self._piles)):
+    @abstractmethod
+    def _pile_version(self, index: int) -> int:
+        pass
+
+    @abstractmethod
+    def _make_pile(self, index: int) -> Tuple[PileSprite, pygame.rect.Rect]:
+        pass
+
+    def draw(self) -> List[pygame.rect.Rect]:
+        # Only piles whose version has moved on since they were last drawn are rebuilt. Returns the areas that changed
+        dirty = []
+        for index in range(self.num_piles):
+            version = self._pile_version(index)
+            if index < len(self._piles):
+                if self._pile_versions[index] == version:
+                    continue
+                old_rect = self._pile_rects[index]
+                self._piles[index], self._pile_rects[index] = self._make_pile(index)
+                self._pile_versions[index] = version
+                area = self._pile_rects[index].union(old_rect)
+            else:
+                pile, rect = self._make_pile(index)
+                self._piles.append(pile)
+                self._pile_rects.append(rect)
+                self._pile_versions.append(version)
+                area = rect
+            self.fill((0, 0, 0, 0), area)
             self.blit(self._piles[index], self._pile_rects[index])
+            dirty.append(area)
+        return dirty
 
     def pile_index_from_pos(self, click_pos) -> Optional[int]:
         for index in range(len(self._pile_rects)):
@@ -105,15 +191,16 @@ class FoundationSprite(MultiPileSprite):
         self._foundation = foundation
         super().__init__((constants.CARD_SIZE[0] * 4 + constants.CARD_GAP * 3, constants.CARD_SIZE[1]))
 
-    def _update_sprites(self):
-        while len(self._piles) < 4:
-            self._piles.append(None)
-            self._pile_rects.append(None)
-        pos = 0
-        for index in range(4):
-            self._piles[index] = PileSprite(Pile(self._foundation.peek(index), visible=True))
-            self._pile_rects[index] = self._piles[index].get_rect(topleft=(pos, 0))
-            pos += constants.CARD_SIZE[0] + constants.CARD_GAP
+    @property
+    def num_piles(self) -> int:
+        return 4
+
+    def _pile_version(self, index: int) -> int:
+        return self._foundation[index].version
+
+    def _make_pile(self, index: int) -> Tuple[PileSprite, pygame.rect.Rect]:
+        pile = self._cache.get(Pile(self._foundation.peek(index), visible=True))
+        return pile, pile.get_rect(topleft=(index * (constants.CARD_SIZE[0] + constants.CARD_GAP), 0))
 
 
 class TableauSprite(MultiPileSprite):
@@ -122,17 +209,16 @@ class TableauSprite(MultiPileSprite):
         super().__init__((constants.CARD_SIZE[0] * tableau.num_piles + constants.CARD_GAP * (tableau.num_piles - 1),
                           500))
 
-    def _update_sprites(self):
-        # print(f'updating tableau')
-        while len(self._piles) < self._tableau.num_piles:
-            self._piles.append(None)
-            self._pile_rects.append(None)
-        pos = 0
-        for index in range(self._tableau.num_piles):
-            # print(f'Length of tableau {index} is {self._tableau.pile_len(index)}')
-            self._piles[index] = PileSprite(self._tableau.peek_all(index))
-            self._pile_rects[index] = self._piles[index].get_rect(topleft = (pos, 0))
-            pos += constants.CARD_SIZE[0] + constants.CARD_GAP
+    @property
+    def num_piles(self) -> int:
+        return self._tableau.num_piles
+
+    def _pile_version(self, index: int) -> int:
+        return self._tableau.version(index)
+
+    def _make_pile(self, index: int) -> Tuple[PileSprite, pygame.rect.Rect]:
+        pile = self._cache.get(self._tableau.peek_all(index))
+        return pile, pile.get_rect(topleft=(index * (constants.CARD_SIZE[0] + constants.CARD_GAP), 0))
 
 
 class DrawPileSprite(MultiPileSprite):
@@ -141,15 +227,21 @@ class DrawPileSprite(MultiPileSprite):
         super().__init__((constants.CARD_SIZE[0] * 2 + constants.NONOVERLAP_DIST * 2 + constants.CARD_GAP,
                           constants.CARD_SIZE[1]))
 
-    def _update_sprites(self):
-        while len(self._piles) < 2:
-            self._piles.append(None)
-            self._pile_rects.append(None)
-        draw = self._draw_pile.peek()
-        self._piles[0] = PileSprite(Pile() if draw is None else draw, PileSprite.StackDirection.LEFT, max_shown=3)
+    @property
+    def num_piles(self) -> int:
+        return 2
+
+    def _pile_version(self, index: int) -> int:
+        # The stock and the waste change together
+        return self._draw_pile.version
+
+    def _make_pile(self, index: int) -> Tuple[PileSprite, pygame.rect.Rect]:
+        if index == 0:
+            draw = self._draw_pile.peek()
+            pile = self._cache.get(Pile() if draw is None else draw, PileSprite.StackDirection.LEFT, max_shown=3)
+            return pile, pile.get_rect(topleft=(0, 0))
         if self._draw_pile.deck_length > 0:
-            self._piles[1] = PileSprite(Pile(Card(Suit.SPADES, Rank.ACE_LOW)))
+            pile = self._cache.get(Pile(Card(Suit.SPADES, Rank.ACE_LOW)))
         else:
-            self._piles[1] = PileSprite(Pile())
-        self._pile_rects[0] = self._piles[0].get_rect(topleft=(0, 0))
-        self._pile_rects[1] = self._piles[1].get_rect(topright=(self.get_size()[0], 0))
+            pile = self._cache.get(Pile())
+        return pile, pile.get_rect(topright=(self.get_size()[0], 0))
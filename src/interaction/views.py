@@ -27,6 +27,7 @@ class PygameView(View, ABC):
             pygame.init()
         self._screen = screen if isinstance(screen, pygame.Surface) else pygame.display.set_mode(screen)
         self._background = default_background
+        self._full_redraw = True
 
     @property
     def screen(self):
@@ -39,17 +40,27 @@ class PygameView(View, ABC):
     def display_game(self):
         if len(pygame.event.get(eventtype=locals.QUIT)) > 0:
             self._model.running = False
-        self._screen.fill(self._background)
-        self._update_sprites()
-        self._draw()
-        pygame.display.flip()
+        if len(pygame.event.get(eventtype=locals.VIDEOEXPOSE)) > 0:
+            self._full_redraw = True
+        # Only the parts of the screen that changed are drawn and pushed to the display, unless all of it is stale
+        dirty = self._update_sprites()
+        if self._full_redraw:
+            self._draw([self._screen.get_rect()])
+            pygame.display.flip()
+            self._full_redraw = False
+        else:
+            dirty = self._draw(dirty)
+            if len(dirty) > 0:
+                pygame.display.update(dirty)
 
     @abstractmethod
-    def _update_sprites(self):
+    def _update_sprites(self) -> List[pygame.rect.Rect]:
+        # Brings the sprites up to date with the model, returning the screen areas that changed
         pass
 
     @abstractmethod
-    def _draw(self):
+    def _draw(self, dirty: List[pygame.rect.Rect]) -> List[pygame.rect.Rect]:
+        # Redraws the given screen areas and anything else that has to be, returning every area drawn over
         pass
 
 
@@ -65,6 +76,11 @@ class KlondikeView(PygameView):
         self._draw_rect = self._draw_pile.get_rect(topright=(board_width, 0))
         self._tableau = TableauSprite(model.tableau)
         self._tableau_rect = self._tableau.get_rect(topleft=(0, constants.CARD_SIZE[1] + constants.CARD_GAP * 2))
+        self._selected: Optional[Tuple[int, PileSprite]] = None
+        self._selected_rect: Optional[pygame.rect.Rect] = None
+        self._board.blit(self._foundation, self._foundation_rect)
+        self._board.blit(self._draw_pile, self._draw_rect)
+        self._board.blit(self._tableau, self._tableau_rect)
 
     def get_pile_from_click(self, click_pos: Tuple[int, int]) -> Optional[Tuple[str, int]]:
         adj_pos = utils.subtract_tuples(click_pos, self._board_rect.topleft)
@@ -90,20 +106,36 @@ class KlondikeView(PygameView):
                 return 'deck', 0
         return None
 
-    def _update_sprites(self):
-        self._foundation.draw()
-        self._foundation_rect = self._foundation.get_rect(topleft=(0, 0))
-        self._draw_pile.draw()
-        self._draw_rect = self._draw_pile.get_rect(topright=(self._board_rect.width, 0))
-        self._tableau.draw()
-        self._tableau_rect = self._tableau.get_rect(topleft=(0, constants.CARD_SIZE[1] + constants.CARD_GAP * 2))
-
-    def _draw(self):
-        self._board.fill((0, 0, 0, 0))
-        self._board.blit(self._foundation, self._foundation_rect)
-        self._board.blit(self._draw_pile, self._draw_rect)
-        self._board.blit(self._tableau, self._tableau_rect)
-        self._screen.blit(self._board, self._board_rect)
-        if self._model.selected is not None:
-            selected = PileSprite(self._model.selected[0])
-            self._screen.blit(selected, selected.get_rect(midtop=pygame.mouse.get_pos()))
+    def _update_sprites(self) -> List[pygame.rect.Rect]:
+        dirty = []
+        for sprite, rect in ((self._foundation, self._foundation_rect), (self._draw_pile, self._draw_rect),
+                             (self._tableau, self._tableau_rect)):
+            for area in sprite.draw():
+                board_area = area.move(rect.topleft)
+                self._board.fill((0, 0, 0, 0), board_area)
+                self._board.blit(sprite, board_area, area)
+                dirty.append(board_area.move(self._board_rect.topleft))
+        return dirty
+
+    def _selected_sprite(self) -> Optional[PileSprite]:
+        if self._model.selected is None:
+            self._selected = None
+        elif self._selected is None or self._selected[0] != self._model.selected[0].version:
+            self._selected = self._model.selected[0].version, PileSprite(self._model.selected[0])
+        return None if self._selected is None else self._selected[1]
+
+    def _draw(self, dirty: List[pygame.rect.Rect]) -> List[pygame.rect.Rect]:
+        # The selection follows the mouse, so the area it was last drawn over and the one it is drawn over now are
+        # always redrawn
+        if self._selected_rect is not None:
+            dirty.append(self._selected_rect)
+        selected = self._selected_sprite()
+        self._selected_rect = None if selected is None else selected.get_rect(midtop=pygame.mouse.get_pos())
+        if self._selected_rect is not None:
+            dirty.append(self._selected_rect)
+        for area in dirty:
+            self._screen.fill(self._background, area)
+            self._screen.blit(self._board, area, area.move(-self._board_rect.left, -self._board_rect.top))
+        if selected is not None:
+            self._screen.blit(selected, self._selected_rect)
+        return dirty
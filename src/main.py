@@ -1,38 +1,48 @@
 import pygame
-import numpy as np
 from matplotlib import pyplot as plt
 import json
+from typing import Optional
 
 from src.utils import constants
-from src.interaction.controllers import KlondikeAIController
+from src.interaction.ai import BackgroundAIController, KlondikeAIController, MoveScheduler
 from src.model.models import KlondikeModel
 from src.interaction.views import KlondikeView
+from src.simulation.batch import run_batch
+
+
+def watch_game(seed: int, scheduler: Optional[MoveScheduler] = None, background: bool = False):
+    # The scheduler sets how fast the AI plays; the window is drawn at most FPS times a second whatever it is set to,
+    # e.g. MoveScheduler(time_budget=1 / constants.FPS) plays as fast as it can while keeping the frame rate up.
+    # With background set the AI thinks in a worker thread, so the window never waits on it
+    model = KlondikeModel(seed)
+    view = KlondikeView(model)
+    view.setup()
+    if background:
+        controller = BackgroundAIController(model, scheduler=scheduler)
+    else:
+        controller = KlondikeAIController(model, view, scheduler=scheduler)
+
+    clock = pygame.time.Clock()
+    while not model.is_done():
+        controller.update()
+        view.display_game()
+        clock.tick(constants.FPS)
+
+    controller.teardown()
+    model.teardown()
+    view.teardown()
+    return model.foundation.num_cards()
 
 
 def main():
     nruns = 10
-    ncards = np.array([])
-    for _ in range(nruns):
-        model = KlondikeModel()
-        model.setup()
-        view = KlondikeView(model)
-        view.setup()
-        controller = KlondikeAIController(model, view)
-
-        clock = pygame.time.Clock()
-        while not model.is_done():
-            controller.update()
-            view.display_game()
-            clock.tick(constants.FPS)
-
-        ncards = np.append(ncards, model.foundation.num_cards())
-        model.teardown()
-        view.teardown()
+    results = run_batch(nruns)
+    ncards = results.num_cards
 
     with open('data/klondike_results.txt', 'w') as f:
-        f.write(json.dumps(list(ncards)))
+        f.write(json.dumps(ncards.tolist()))
 
-    wins = sum(ncards == 52)
+    wins = results.num_wins
     total_cards = sum(ncards)
     print(ncards)
     print(f'Won {wins} out of {nruns} games ({wins / nruns * 100}%), with an average of {total_cards / nruns} cards per game ({total_cards} total)')
@@ -1,17 +1,42 @@
 from typing import *
 from src.model.deck import *
+from src.model.locations import CardLocations
+from src.model.zobrist import ZobristHash
 import src.utils.utils as utils
 
 
 class Foundation:
-    def __init__(self, starting_rank: Optional[Rank] = None):
+    def __init__(self, starting_rank: Optional[Rank] = None, stacking_method: Optional[StackingMethod] = None):
         self._foundations: List[Pile] = []
+        # Which foundation each suit has been started on
+        self._suit_foundations: Dict[Suit, int] = {}
         self.starting_rank = starting_rank
+        if stacking_method is None:
+            stacking_method = StackingMethod(-1, SuitStackMethod.SUIT,
+                                             stack_on_blank=True if starting_rank is None else {starting_rank})
+        self._stacking_method = stacking_method
+
+    @property
+    def stacking_method(self) -> StackingMethod:
+        return self._stacking_method
 
     def setup(self):
         self._foundations = []
         for _ in range(4):
             self._foundations.append(Pile())
+        self.reindex()
+
+    @property
+    def version(self) -> int:
+        # Changes whenever any foundation does
+        return max(found.version for found in self._foundations)
+
+    def reindex(self):
+        # Rebuilds the suit index, for when the piles have been changed other than through add_card and pop
+        self._suit_foundations = {}
+        for index, found in enumerate(self._foundations):
+            if len(found) > 0:
+                self._suit_foundations[found.peek().suit] = index
 
     def has_won(self) -> bool:
         for found in self._foundations:
@@ -25,33 +50,60 @@ class Foundation:
             total += len(found)
         return total
 
+    def find_foundation(self, card: Card) -> int:
+        foundation = self._suit_foundations.get(card.suit)
+        if foundation is not None:
+            return foundation
+        for index in range(len(self._foundations)):
+            if len(self._foundations[index]) == 0:
+                return index
+        return -1
+
+    def can_add_card(self, card: Card, foundation: int = -1) -> bool:
+        if foundation == -1:
+            foundation = self.find_foundation(card)
+        return card.can_stack_on(self._foundations[foundation], self._stacking_method)
+
     def add_card(self, card: Card, foundation: int = -1) -> bool:
         if foundation == -1:
-            empty_index = -1
-            for index in range(len(self._foundations)):
-                if len(self._foundations[index]) == 0 and empty_index == -1:
-                    empty_index = index
-                elif len(self._foundations[index]) > 0 and self._foundations[index].peek().suit == card.suit:
-                    foundation = index
-            if foundation == -1:
-                foundation = empty_index
-        if (len(self._foundations[foundation]) == 0 and (self.starting_rank is None or card.rank == self.starting_rank))\
-                or card.can_stack_on(self._foundations[foundation], StackingMethod(-1, SuitStackMethod.SUIT)):
-            self._foundations[foundation] = Pile(card, visible=True) + self._foundations[foundation]
+            foundation = self.find_foundation(card)
+        if card.can_stack_on(self._foundations[foundation], self._stacking_method):
+            self._foundations[foundation].push(card, visible=True)
+            if len(self._foundations[foundation]) == 1:
+                self._suit_foundations[card.suit] = foundation
             return True
         return False
 
     def pop(self, foundation: int) -> Card:
-        return self._foundations[foundation].draw()
+        card = self._foundations[foundation].draw()
+        if card is not None and len(self._foundations[foundation]) == 0:
+            self._suit_foundations.pop(card.suit, None)
+        return card
 
     def peek(self, foundation: int) -> Card:
         return self._foundations[foundation].peek()
 
+    def track_zobrist(self, zobrist: Optional[ZobristHash], first_slot: int):
+        for index, found in enumerate(self._foundations):
+            found.track_zobrist(zobrist, first_slot + index, hash_visibility=False)
+
+    def track_locations(self, locations: Optional[CardLocations]):
+        for index, found in enumerate(self._foundations):
+            found.track_locations(locations, 'foundation', index)
+
+    def __len__(self):
+        return len(self._foundations)
+
+    def __getitem__(self, item) -> Pile:
+        return self._foundations[item]
+
 
 class Tableau:
     def __init__(self, stacking_method: StackingMethod, pile_lens: Tuple[int, ...],
                  num_visible_on_init: Union[Tuple[int, ...], int] = 1, max_cards_moved: Optional[int] = None):
         self._tableau: List[Pile] = []
+        # Version of each pile when its top cards were last turned up
+        self._shown_versions: List[int] = []
         self._num_tableau_piles = len(pile_lens)
         self._init_pile_lens = pile_lens
         self._stacking_method = stacking_method
@@ -74,6 +126,15 @@ class Tableau:
     def pile_len(self, pile_index: int) -> int:
         return len(self._tableau[pile_index])
 
+    def __setstate__(self, state):
+        # The piles get new versions when unpickled, and the ones recorded here came from another process, so no pile
+        # counts as shown until it is checked again
+        self.__dict__.update(state)
+        self._shown_versions = [0] * len(self._tableau)
+
+    def version(self, pile_index: int) -> int:
+        return self._tableau[pile_index].version
+
     def update_max_cards_moved(self, max_cards_moved: Optional[int]):
         self._max_cards_moved = max_cards_moved
 
@@ -86,27 +147,29 @@ class Tableau:
                 if len(self._tableau) <= pile:
                     self._tableau.append(Pile())
                 if len(self._tableau[pile]) < self.init_pile_lens[pile]:
-                    self._tableau[pile] = Pile(deck.draw(), visible=False) + self._tableau[pile]
+                    self._tableau[pile].push(deck.draw())
                     added_card = True
         for pile in range(self.num_piles):
             for card in range(self._num_visible_on_init[pile]):
                 self._tableau[pile].make_visible(card)
+        self._shown_versions = [pile.version for pile in self._tableau]
 
     def pop_card(self, pile_index: int) -> Optional[Card]:
         return self._tableau[pile_index].draw()
 
     def pop_pile(self, pile_index: int) -> Optional[Pile]:
-        ret, self._tableau[pile_index] = self._tableau[pile_index].split_by_stackable(self._stacking_method)
-        return ret
+        pile = self._tableau[pile_index]
+        return pile.take_top(pile.num_stackable_on_top(self._stacking_method))
 
     def peek(self, pile_index: int) -> Pile:
-        return self._tableau[pile_index].split_by_visible()[0]
+        pile = self._tableau[pile_index]
+        return pile.top(pile.num_visible_on_top())
 
     def peek_all(self, pile_index: int) -> Pile:
         return self._tableau[pile_index]
 
     def replace(self, pile: Pile, pile_index: int):
-        self._tableau[pile_index] = pile + self._tableau[pile_index]
+        self._tableau[pile_index].extend(pile)
 
     def add_card(self, pile: Pile, pile_index: int) -> bool:
         if len(self._tableau[pile_index]) == 0 or pile.can_stack_on(self._tableau[pile_index], self._stacking_method):
@@ -115,10 +178,23 @@ class Tableau:
         return False
 
     def show_top_cards(self, num_to_show: Optional[int] = None):
+        # Piles that have not changed since their top cards were last turned up are skipped
         for tab in range(len(self._tableau)):
+            if num_to_show is None and self._tableau[tab].version == self._shown_versions[tab]:
+                continue
             for index in range(min(self._num_visible_on_init[tab] if num_to_show is None else num_to_show,
                                    len(self._tableau[tab]))):
                 self._tableau[tab].make_visible(index)
+            if num_to_show is None:
+                self._shown_versions[tab] = self._tableau[tab].version
+
+    def track_zobrist(self, zobrist: Optional[ZobristHash], first_slot: int):
+        for index, pile in enumerate(self._tableau):
+            pile.track_zobrist(zobrist, first_slot + index)
+
+    def track_locations(self, locations: Optional[CardLocations]):
+        for index, pile in enumerate(self._tableau):
+            pile.track_locations(locations, 'tableau', index)
 
     def __len__(self):
         return self.num_piles
@@ -128,11 +204,20 @@ class Tableau:
 
 
 class DrawPile:
+    # The stock and waste share one array: the waste bottom first up to the cursor, then the stock top first. Dealing
+    # reverses the next few cards in place and moves the cursor past them, and turning the waste over just moves the
+    # cursor back to the start. The cards on show are always the few just below the cursor
     def __init__(self, deck: Pile, flip_amount: int = 3, num_visible: int = -1):
-        self._deck = deck
-        self._draw = Pile()
+        self._cards: List[int] = []
+        self._cursor = 0
+        self._version = new_pile_version()
+        self._zobrist: Optional[ZobristHash] = None
+        self._deck_slot = 0
+        self._draw_slot = 0
+        self._locations: Optional[CardLocations] = None
         self._flip_amount = flip_amount
         self._num_visible = flip_amount if num_visible < 0 else num_visible
+        self.setup(deck)
 
     @property
     def flip_amount(self) -> int:
@@ -140,43 +225,151 @@ class DrawPile:
 
     @property
     def num_visible(self) -> int:
-        return min(len(self._draw), self._num_visible)
+        return min(self._cursor, self._num_visible)
 
     @property
     def deck_length(self) -> int:
-        return len(self._deck)
+        return len(self._cards) - self._cursor
+
+    @property
+    def version(self) -> int:
+        # Changes whenever the stock or the waste does
+        return self._version
+
+    def __setstate__(self, state):
+        # As for Pile, versions from another process could clash with ones handed out here
+        self.__dict__.update(state)
+        self._version = new_pile_version()
 
     def setup(self, deck: Pile):
-        self._deck = deck
-        self._draw = Pile()
-
-    def deal(self):
-        self._draw.hide_all()
-        if len(self._deck) == 0:
-            self._deck = reversed(self._draw)
-            self._draw = Pile()
+        self.load(deck.card_ids, [])
+
+    @property
+    def card_ids(self) -> Tuple[List[int], List[int]]:
+        # Stock and waste, each bottom card first
+        return self._cards[self._cursor:][::-1], self._cards[:self._cursor]
+
+    def _zobrist_range(self, start: int, stop: int) -> int:
+        # Waste cards are hashed by position from the bottom of the waste and stock cards by position from the bottom of
+        # the stock, so taking a card off the waste or putting one back leaves every other card's key alone
+        value = 0
+        for index in range(start, stop):
+            if index < self._cursor:
+                value ^= zobrist_card_key(self._draw_slot, index, self._cards[index])
+            else:
+                value ^= zobrist_card_key(self._deck_slot, len(self._cards) - 1 - index, self._cards[index])
+        return value
+
+    def _update_zobrist(self, start: int, stop: int):
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(start, stop)
+
+    def track_zobrist(self, zobrist: Optional[ZobristHash], deck_slot: int, draw_slot: int):
+        # Which side of the stock/waste split a card is on is part of the hash, but which waste cards are on show is not
+        self._update_zobrist(0, len(self._cards))
+        self._zobrist = zobrist
+        self._deck_slot = deck_slot
+        self._draw_slot = draw_slot
+        self._update_zobrist(0, len(self._cards))
+
+    def track_locations(self, locations: Optional[CardLocations]):
+        # The stock is tracked as pile type 'deck' and the waste as 'draw'
+        self._forget_locations()
+        self._locations = locations
+        self._update_locations(0, len(self._cards))
+
+    def _update_locations(self, start: int, stop: int):
+        if self._locations is not None:
+            for index in range(start, stop):
+                if index < self._cursor:
+                    self._locations.place(self._cards[index], 'draw', 0, index)
+                else:
+                    self._locations.place(self._cards[index], 'deck', 0, len(self._cards) - 1 - index)
+            self._resize_locations()
+
+    def _forget_locations(self):
+        if self._locations is not None:
+            self._locations.remove_all(self._cards[:self._cursor], 'draw', 0)
+            self._locations.remove_all(self._cards[self._cursor:], 'deck', 0)
+
+    def _resize_locations(self):
+        self._locations.resize('draw', 0, self._cursor)
+        self._locations.resize('deck', 0, len(self._cards) - self._cursor)
+
+    def load(self, deck: List[int], draw: List[int]):
+        # Like Pile.load, keeps its version if nothing would change
+        cards = list(draw) + list(deck)[::-1]
+        if cards == self._cards and len(draw) == self._cursor:
+            return
+        self._update_zobrist(0, len(self._cards))
+        self._forget_locations()
+        self._cards = cards
+        self._cursor = len(draw)
+        self._version = new_pile_version()
+        self._update_zobrist(0, len(self._cards))
+        self._update_locations(0, len(self._cards))
+
+    def deal(self) -> int:
+        # Returns the number of cards dealt onto the waste, which is 0 when the waste was turned back over
+        self._version = new_pile_version()
+        if self._cursor == len(self._cards):
+            # No card moves, but every card changes side, so only the hash and location index have to visit them all
+            self._update_zobrist(0, len(self._cards))
+            self._cursor = 0
+            self._update_zobrist(0, len(self._cards))
+            self._update_locations(0, len(self._cards))
+            return 0
+        num_dealt = min(self.flip_amount, self.deck_length)
+        self._move_cursor(self._cursor + num_dealt)
+        return num_dealt
+
+    def undeal(self, num_dealt: int):
+        self._version = new_pile_version()
+        if num_dealt == 0:
+            self._update_zobrist(0, len(self._cards))
+            self._cursor = len(self._cards)
+            self._update_zobrist(0, len(self._cards))
+            self._update_locations(0, len(self._cards))
         else:
-            drawn = self._deck.draw(min(self.flip_amount, len(self._deck)))
-            if isinstance(drawn, Card):
-                drawn = Pile(drawn, visible=True)
-            self._draw = drawn + self._draw
-            self._draw.hide_all()
-            for index in range(self.num_visible):
-                self._draw.make_visible(index)
+            self._move_cursor(self._cursor - num_dealt)
+
+    def _move_cursor(self, cursor: int):
+        # Dealt cards keep their order on the waste, so the segment between the old and new cursor is reversed
+        start, stop = min(cursor, self._cursor), max(cursor, self._cursor)
+        self._update_zobrist(start, stop)
+        self._cards[start:stop] = self._cards[start:stop][::-1]
+        self._cursor = cursor
+        self._update_zobrist(start, stop)
+        self._update_locations(start, stop)
 
     def pop(self) -> Optional[Card]:
-        return None if len(self._draw) == 0 else self._draw.draw()
+        if self._cursor == 0:
+            return None
+        self._version = new_pile_version()
+        self._update_zobrist(self._cursor - 1, self._cursor)
+        self._cursor -= 1
+        card = self._cards.pop(self._cursor)
+        if self._locations is not None:
+            self._locations.remove_all((card,), 'draw', 0)
+            self._resize_locations()
+        return CARDS[card]
+
+    def peek_card(self) -> Optional[Card]:
+        return None if self._cursor == 0 else CARDS[self._cards[self._cursor - 1]]
 
     def peek(self) -> Optional[Pile]:
-        if len(self._draw) == 0:
+        if self._cursor == 0:
             return None
         pile = Pile()
-        for index in range(self.num_visible):
-            pile += Pile(self._draw[index], visible=True)
+        pile.load(self._cards[self._cursor - self.num_visible:self._cursor], -1)
         return pile
 
     def replace(self, card: Pile):
         if len(card) > 1:
             raise ValueError('Cannot return more than one card')
-        self._draw = card + self._draw
-        self._draw.make_visible(0)
+        self._version = new_pile_version()
+        for card_id in card.card_ids:
+            self._cards.insert(self._cursor, card_id)
+            self._cursor += 1
+            self._update_zobrist(self._cursor - 1, self._cursor)
+            self._update_locations(self._cursor - 1, self._cursor)
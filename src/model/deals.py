@@ -0,0 +1,50 @@
+from typing import List, Union
+
+import numpy as np
+
+DECK_SIZE = 52
+
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+
+
+def mix64(x: int) -> int:
+    # splitmix64 finaliser, so that deal N's shuffle depends only on N and not on any shared RNG state
+    x = (x + _GOLDEN) & _MASK
+    x = ((x ^ (x >> 30)) * _MIX1) & _MASK
+    x = ((x ^ (x >> 27)) * _MIX2) & _MASK
+    return x ^ (x >> 31)
+
+
+def mix64_array(x: np.ndarray) -> np.ndarray:
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(_GOLDEN)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(_MIX1)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(_MIX2)
+    return x ^ (x >> np.uint64(31))
+
+
+def deal_permutation(deal: int, num_cards: int = DECK_SIZE) -> List[int]:
+    perm = list(range(num_cards))
+    key = mix64(deal & _MASK)
+    for index in range(num_cards - 1, 0, -1):
+        swap = mix64(key ^ index) % (index + 1)
+        perm[index], perm[swap] = perm[swap], perm[index]
+    return perm
+
+
+def deal_permutations(deals: Union[int, range, np.ndarray], num_cards: int = DECK_SIZE) -> np.ndarray:
+    if isinstance(deals, int):
+        deals = range(deals)
+    deals = np.asarray(deals, dtype=np.int64).astype(np.uint64)
+    perms = np.tile(np.arange(num_cards, dtype=np.uint8), (len(deals), 1))
+    rows = np.arange(len(deals))
+    keys = mix64_array(deals)
+    for index in range(num_cards - 1, 0, -1):
+        swap = (mix64_array(keys ^ np.uint64(index)) % np.uint64(index + 1)).astype(np.intp)
+        swapped = perms[rows, swap]
+        perms[rows, swap] = perms[:, index]
+        perms[:, index] = swapped
+    return perms
@@ -1,7 +1,17 @@
 import copy
 from enum import Enum
+import functools
+import itertools
+from numbers import Integral
 import random
-from typing import List, Union, Optional, Tuple, Callable
+from typing import List, Union, Optional, Tuple, Sequence, Iterable, FrozenSet
+
+from src.model.deals import deal_permutation
+from src.model.locations import CardLocations
+from src.model.zobrist import ZobristHash, zobrist_keys, NUM_ZOBRIST_SLOTS, NUM_ZOBRIST_POSITIONS
+
+# A deal number, an RNG object, or an explicit permutation of the deck (eg a row from deals.deal_permutations)
+Shuffler = Union[None, int, random.Random, Sequence[int]]
 
 
 class Suit(Enum):
@@ -56,6 +66,9 @@ class Rank(Enum):
     def __eq__(self, other: Union['Card', 'Rank']) -> bool:
         return self.rank == other.rank
 
+    def __hash__(self) -> int:
+        return hash(self.rank)
+
     def __int__(self):
         return self.rank
 
@@ -72,42 +85,119 @@ class SuitStackMethod(Enum):
     SUIT = 2,
 
 
+@functools.lru_cache(maxsize=None)
+def _compile_stack_table(rank_diff: Optional[int], suit_method: Optional[SuitStackMethod]) -> Tuple[int, ...]:
+    # table[card] is a bitmask over the ids of the cards that card may be placed on
+    table = []
+    for card in range(NUM_CARD_IDS):
+        targets = 0
+        for target in range(NUM_CARD_IDS):
+            if rank_diff is not None and CARD_RANK_VALUES[target] - CARD_RANK_VALUES[card] != rank_diff:
+                continue
+            if suit_method == SuitStackMethod.ALTERNATING and CARD_IS_BLACK[card] == CARD_IS_BLACK[target]:
+                continue
+            if suit_method == SuitStackMethod.COLOR and CARD_IS_BLACK[card] != CARD_IS_BLACK[target]:
+                continue
+            if suit_method == SuitStackMethod.SUIT and CARD_SUITS[card] != CARD_SUITS[target]:
+                continue
+            targets |= 1 << target
+        table.append(targets)
+    return tuple(table)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_blank_table(blank_ranks: FrozenSet[Rank]) -> Tuple[bool, ...]:
+    return tuple(CARD_RANKS[card] in blank_ranks for card in range(NUM_CARD_IDS))
+
+
 class StackingMethod:
+    # Rules are plain data (a rank difference, a suit rule and the set of ranks an empty pile accepts), so methods can
+    # be pickled, hashed and compiled once into lookup tables
     def __init__(self, rank_diff: Optional[int], suit_method: Optional[SuitStackMethod],
-                 stack_on_blank: Union[bool, Callable[['Card'], bool]] = False):
-        self.rank_diff = rank_diff
-        self.suit_method = suit_method
-        self.stack_on_blank = (lambda c: stack_on_blank) if isinstance(stack_on_blank, bool) else stack_on_blank
+                 stack_on_blank: Union[bool, Iterable[Rank]] = False):
+        self._rank_diff = rank_diff
+        self._suit_method = suit_method
+        if isinstance(stack_on_blank, bool):
+            self._blank_ranks = frozenset(Rank) if stack_on_blank else frozenset()
+        else:
+            self._blank_ranks = frozenset(stack_on_blank)
+        self._stack_table: Optional[Tuple[int, ...]] = None
+        self._blank_table: Optional[Tuple[bool, ...]] = None
 
+    @property
+    def rank_diff(self) -> Optional[int]:
+        return self._rank_diff
 
-class Card:
-    def __init__(self, suit: Suit, rank: Rank):
-        self.suit = suit
-        self.rank = rank
+    @property
+    def suit_method(self) -> Optional[SuitStackMethod]:
+        return self._suit_method
+
+    @property
+    def blank_ranks(self) -> FrozenSet[Rank]:
+        return self._blank_ranks
+
+    @property
+    def stack_table(self) -> Tuple[int, ...]:
+        if self._stack_table is None:
+            self._stack_table = _compile_stack_table(self._rank_diff, self._suit_method)
+        return self._stack_table
 
     @property
-    def is_black(self) -> bool:
-        return self.suit.is_black
+    def blank_table(self) -> Tuple[bool, ...]:
+        if self._blank_table is None:
+            self._blank_table = _compile_blank_table(self._blank_ranks)
+        return self._blank_table
+
+    def stack_on_blank(self, card: 'Card') -> bool:
+        return card.rank in self._blank_ranks
+
+    def can_stack(self, card: int, target: Optional[int]) -> bool:
+        # target is None for an empty pile
+        if target is None:
+            return self.blank_table[card]
+        return bool(self.stack_table[card] >> target & 1)
+
+    def _key(self) -> Tuple:
+        return self._rank_diff, self._suit_method, self._blank_ranks
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, StackingMethod) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __reduce__(self):
+        return StackingMethod, self._key()
+
+    def __repr__(self) -> str:
+        blank = sorted(self._blank_ranks, key=lambda rank: rank.rank)
+        return f'StackingMethod({self._rank_diff}, {self._suit_method}, stack_on_blank={blank})'
+
+
+class Card:
+    # Cards are interned: Card(suit, rank) always returns the same immutable object, identified by a small int id
+    __slots__ = ('suit', 'rank', 'id', 'is_black')
+
+    def __new__(cls, suit: Suit, rank: Rank) -> 'Card':
+        return CARDS[card_id(suit, rank)]
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Cards are immutable')
+
+    def __delattr__(self, key):
+        raise AttributeError('Cards are immutable')
 
     def can_stack_on(self, card: Union['Card', 'Pile'], method: StackingMethod) -> bool:
         if card is None or (isinstance(card, Pile) and len(card) == 0):
-            return method.stack_on_blank(self)
+            return method.blank_table[self.id]
         if isinstance(card, Pile):
             if not card.is_visible(0):
                 return False
             card = card[0]
-        if method.rank_diff is not None and card - self != method.rank_diff:
-            return False
-        if method.suit_method == SuitStackMethod.ALTERNATING:
-            return self.is_black ^ card.is_black
-        elif method.suit_method == SuitStackMethod.COLOR:
-            return self.is_black == card.is_black
-        elif method.suit_method == SuitStackMethod.SUIT:
-            return self.suit == card.suit
-        return True
+        return bool(method.stack_table[self.id] >> card.id & 1)
 
     def __sub__(self, other: 'Card') -> int:
-        return int(self.rank) - int(other.rank)
+        return CARD_RANK_VALUES[self.id] - CARD_RANK_VALUES[other.id]
 
     def __lt__(self, other: Union['Card', Rank]) -> bool:
         return self.rank < other.rank
@@ -124,10 +214,13 @@ class Card:
     def __eq__(self, other: Union['Card', Rank]) -> bool:
         if isinstance(other, Rank):
             return self.rank == other.rank
-        return self.rank == other.rank and self.suit == other.suit
+        return self is other
+
+    def __hash__(self) -> int:
+        return self.id
 
     def __int__(self) -> int:
-        return int(self.rank)
+        return CARD_RANK_VALUES[self.id]
 
     def __str__(self) -> str:
         return str(self.rank) + str(self.suit)
@@ -136,39 +229,256 @@ class Card:
         return str(self)
 
     def __copy__(self) -> 'Card':
-        return Card(self.suit, self.rank)
+        return self
+
+    def __deepcopy__(self, memo) -> 'Card':
+        return self
+
+    def __reduce__(self):
+        return card_from_id, (self.id,)
+
+
+# Ids 0-51 are the standard deck (suit-major, ace low to king); 52-55 are the aces when aces are high
+NUM_CARD_IDS = 56
+_SUIT_INDEX = {suit: index for index, suit in enumerate(Suit)}
+
+
+def card_id(suit: Suit, rank: Rank) -> int:
+    if rank.rank == Rank.ACE_HIGH.rank:
+        return 52 + _SUIT_INDEX[suit]
+    return _SUIT_INDEX[suit] * 13 + rank.rank - 1
+
+
+def card_from_id(card: int) -> Card:
+    return CARDS[card]
+
+
+def _make_card(suit: Suit, rank: Rank) -> Card:
+    card = object.__new__(Card)
+    object.__setattr__(card, 'suit', suit)
+    object.__setattr__(card, 'rank', rank)
+    object.__setattr__(card, 'id', card_id(suit, rank))
+    object.__setattr__(card, 'is_black', suit.is_black)
+    return card
+
+
+CARDS: List[Card] = [None] * NUM_CARD_IDS
+for _suit in Suit:
+    for _rank in Rank:
+        _card = _make_card(_suit, _rank)
+        CARDS[_card.id] = _card
+CARD_SUITS: List[Suit] = [card.suit for card in CARDS]
+CARD_RANKS: List[Rank] = [card.rank for card in CARDS]
+CARD_RANK_VALUES: List[int] = [card.rank.rank for card in CARDS]
+CARD_IS_BLACK: List[bool] = [card.is_black for card in CARDS]
+
+_ZOBRIST_CARD_KEYS = zobrist_keys(NUM_ZOBRIST_SLOTS * NUM_ZOBRIST_POSITIONS * NUM_CARD_IDS, 0)
+_ZOBRIST_FACE_UP_KEYS = zobrist_keys(NUM_ZOBRIST_SLOTS * NUM_ZOBRIST_POSITIONS, 1)
+
+# Every change to any pile takes the next number, so a version never repeats even across replaced piles
+_PILE_VERSIONS = itertools.count(1)
+
+
+def new_pile_version() -> int:
+    return next(_PILE_VERSIONS)
+
+
+def zobrist_card_key(slot: int, position: int, card: int) -> int:
+    return _ZOBRIST_CARD_KEYS[(slot * NUM_ZOBRIST_POSITIONS + position) * NUM_CARD_IDS + card]
 
 
 class Pile:
+    # Cards are stored bottom first so the top of the pile is the end of the list, and visibility is a bitmask over
+    # those storage positions. The public API still indexes from the top: pile[0] is the top card, pile[-1] the bottom
     def __init__(self, start_card: Union[Card, List[Card]] = None, aces_high: bool = False, start_full: bool = False,
-                 shuffled: bool = True, visible: bool = False):
-        self._cards = []
+                 shuffled: bool = True, visible: bool = False, rng: Shuffler = None):
+        self._version = next(_PILE_VERSIONS)
+        self._zobrist: Optional[ZobristHash] = None
+        self._zobrist_base = 0
+        self._zobrist_visibility = False
+        self._locations: Optional[CardLocations] = None
+        self._location_type = ''
+        self._location_index = 0
+        self._cards: List[int] = []
         if start_card is not None:
             if isinstance(start_card, Card):
-                self._cards.append(copy.copy(start_card))
+                self._cards.append(start_card.id)
             elif isinstance(start_card, list):
-                for card in start_card:
-                    self._cards.append(copy.copy(card))
+                self._cards = [card.id for card in reversed(start_card)]
         elif start_full:
             for suit in Suit:
                 for rank in Rank:
                     if (aces_high and rank == Rank.ACE_LOW) or (not aces_high and rank == Rank.ACE_HIGH):
                         continue
-                    self._cards.append(Card(suit, rank))
+                    self._cards.append(card_id(suit, rank))
+            self._cards.reverse()
             if shuffled:
-                self.shuffle()
-        self._visible_cards = set()
-        if visible:
-            for card in range(len(self._cards)):
-                self._visible_cards.add(card)
+                self.shuffle(rng)
+        self._visible = (1 << len(self._cards)) - 1 if visible else 0
         self._aces_high = aces_high
 
+    @classmethod
+    def _from_ids(cls, cards: List[int], visible: int = 0, aces_high: bool = False) -> 'Pile':
+        pile = cls(aces_high=aces_high)
+        pile._cards = cards
+        pile._visible = visible
+        return pile
+
     @property
     def aces_high(self):
         return self._aces_high
 
-    def shuffle(self):
-        random.shuffle(self._cards)
+    @property
+    def version(self) -> int:
+        # Changes whenever the cards or their visibility do, so anything derived from the pile can be cached against it
+        return self._version
+
+    def __setstate__(self, state):
+        # Versions only mean anything within one process, so an unpickled pile takes a new one from this process
+        self.__dict__.update(state)
+        self._version = new_pile_version()
+
+    @property
+    def state_key(self) -> Tuple[bytes, int]:
+        # Equal for any two piles with the same cards face up and face down, unlike the version
+        return bytes(self._cards), self._visible
+
+    @property
+    def card_ids(self) -> List[int]:
+        # Bottom card first
+        return self._cards
+
+    def _set_visibility(self, visible: int):
+        if self._zobrist is not None and self._zobrist_visibility:
+            changed = self._visible ^ visible
+            while changed:
+                lowest = changed & -changed
+                self._zobrist.value ^= _ZOBRIST_FACE_UP_KEYS[self._zobrist_base + lowest.bit_length() - 1]
+                changed ^= lowest
+        if visible != self._visible:
+            self._version = next(_PILE_VERSIONS)
+        self._visible = visible
+
+    def track_zobrist(self, zobrist: Optional[ZobristHash], slot: int = 0, hash_visibility: bool = True):
+        # Keeps zobrist up to date with this pile's cards as they change; None stops tracking
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(0, len(self._cards))
+        self._zobrist = zobrist
+        self._zobrist_base = slot * NUM_ZOBRIST_POSITIONS
+        self._zobrist_visibility = hash_visibility
+        if zobrist is not None:
+            zobrist.value ^= self._zobrist_range(0, len(self._cards))
+
+    def _zobrist_range(self, start: int, stop: int) -> int:
+        value = 0
+        for position in range(start, stop):
+            value ^= _ZOBRIST_CARD_KEYS[(self._zobrist_base + position) * NUM_CARD_IDS + self._cards[position]]
+            if self._zobrist_visibility and self._visible >> position & 1:
+                value ^= _ZOBRIST_FACE_UP_KEYS[self._zobrist_base + position]
+        return value
+
+    def track_locations(self, locations: Optional[CardLocations], pile_type: str = '', pile_index: int = 0):
+        # Keeps locations up to date with where this pile's cards are; None stops tracking
+        if self._locations is not None:
+            self._locations.remove_all(self._cards, self._location_type, self._location_index)
+        self._locations = locations
+        self._location_type = pile_type
+        self._location_index = pile_index
+        self._place(0)
+
+    def _place(self, start: int):
+        # Records where the cards from start up now are
+        if self._locations is not None:
+            self._locations.place_all(self._cards[start:], self._location_type, self._location_index, start)
+            self._locations.resize(self._location_type, self._location_index, len(self._cards))
+
+    def _unplace(self, start: int):
+        # Forgets the cards from start up, before they are taken off
+        if self._locations is not None:
+            self._locations.remove_all(self._cards[start:], self._location_type, self._location_index)
+            self._locations.resize(self._location_type, self._location_index, start)
+
+    def _position(self, card: int) -> int:
+        if card < 0:
+            card = len(self._cards) + card
+        return len(self._cards) - 1 - card
+
+    def load(self, cards: List[int], visible: int = 0):
+        # Replaces the contents with the given ids (bottom first) and visibility mask. Loading what the pile already
+        # holds changes nothing, so it keeps its version
+        cards = list(cards)
+        visible &= (1 << len(cards)) - 1
+        if cards == self._cards and visible == self._visible:
+            return
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(0, len(self._cards))
+        self._unplace(0)
+        self._cards = cards
+        self._visible = visible
+        self._version = next(_PILE_VERSIONS)
+        self._place(0)
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(0, len(self._cards))
+
+    def shuffle(self, rng: Shuffler = None):
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(0, len(self._cards))
+        if rng is None:
+            random.shuffle(self._cards)
+        elif isinstance(rng, random.Random):
+            rng.shuffle(self._cards)
+        else:
+            perm = deal_permutation(int(rng), len(self)) if isinstance(rng, Integral) else rng
+            if len(perm) != len(self):
+                raise ValueError(f'Permutation has {len(perm)} cards but the pile has {len(self)}')
+            # Permutations are given top first
+            top_first = self._cards[::-1]
+            self._cards = [top_first[index] for index in reversed(perm)]
+        self._version = next(_PILE_VERSIONS)
+        self._place(0)
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(0, len(self._cards))
+
+    def push(self, card: Card, visible: bool = False):
+        if visible:
+            self._visible |= 1 << len(self._cards)
+        self._cards.append(card.id)
+        self._version = next(_PILE_VERSIONS)
+        self._place(len(self._cards) - 1)
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(len(self._cards) - 1, len(self._cards))
+
+    def extend(self, pile: 'Pile'):
+        # Places pile on top of this one, keeping its order and visibility
+        start = len(self._cards)
+        self._visible |= pile._visible << start
+        self._cards.extend(pile._cards)
+        self._version = next(_PILE_VERSIONS)
+        self._place(start)
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(start, len(self._cards))
+
+    def take_top(self, num_cards: int) -> 'Pile':
+        split = max(0, len(self._cards) - num_cards)
+        pile = Pile._from_ids(self._cards[split:], self._visible >> split, self.aces_high)
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(split, len(self._cards))
+        self._unplace(split)
+        del self._cards[split:]
+        self._visible &= (1 << split) - 1
+        self._version = next(_PILE_VERSIONS)
+        return pile
+
+    def reversed_into(self, pile: 'Pile'):
+        # Empties this pile onto the top of pile in reverse order, so this pile's bottom card ends up on top
+        self._unplace(0)
+        for position in range(len(self._cards) - 1, -1, -1):
+            pile.push(CARDS[self._cards[position]], bool(self._visible >> position & 1))
+        if self._zobrist is not None:
+            self._zobrist.value ^= self._zobrist_range(0, len(self._cards))
+        self._cards = []
+        self._visible = 0
+        self._version = next(_PILE_VERSIONS)
 
     def draw(self, num_cards: int = 1) -> Optional[Union[Card, 'Pile']]:
         if len(self) == 0:
@@ -176,19 +486,15 @@ class Pile:
         if num_cards < 1:
             num_cards = len(self) + num_cards
         if num_cards == 1:
-            card = self._cards[0]
-            self._cards.remove(card)
-            if 0 in self._visible_cards:
-                self._visible_cards.remove(0)
-            for index in range(1, len(self) + 1):
-                if index in self._visible_cards:
-                    self._visible_cards.remove(index)
-                    self._visible_cards.add(index - 1)
-            return card
+            if self._zobrist is not None:
+                self._zobrist.value ^= self._zobrist_range(len(self._cards) - 1, len(self._cards))
+            self._unplace(len(self._cards) - 1)
+            card = self._cards.pop()
+            self._visible &= (1 << len(self._cards)) - 1
+            self._version = next(_PILE_VERSIONS)
+            return CARDS[card]
         else:
-            pile = Pile()
-            pile = self.move_to(pile, num_cards)
-            return pile
+            return self.take_top(num_cards)
 
     def peek(self, num_cards: int = 1) -> Optional[Union[Card, 'Pile']]:
         if len(self) == 0:
@@ -196,148 +502,128 @@ class Pile:
         if num_cards == 1:
             return self[0]
         else:
-            pile = Pile()
-            for card in range(num_cards):
-                pile += Pile(self[card], visible=self.is_visible(card))
-            return pile
+            return self.top(num_cards)
 
     def move_to(self, pile: 'Pile', num_cards: int = 1) -> 'Pile':
-        for _ in range(num_cards):
-            visible = 0 in self._visible_cards
-            pile += Pile(self.draw(), visible=visible)
-        return pile
+        return pile + self.take_top(num_cards)
 
     def flip(self, card: int):
-        if card < 0:
-            card = len(self) + card
-        if card in self._visible_cards:
-            self.make_hidden(card)
-        else:
-            self.make_visible(card)
+        position = self._position(card)
+        if 0 <= position < len(self._cards):
+            self._set_visibility(self._visible ^ 1 << position)
 
     def flip_all(self):
-        for index in range(len(self)):
-            self.flip(index)
+        self._set_visibility(self._visible ^ (1 << len(self._cards)) - 1)
 
     def make_visible(self, card: int):
-        if card < 0:
-            card = len(self) + card
-        self._visible_cards.add(card)
+        position = self._position(card)
+        if 0 <= position < len(self._cards):
+            self._set_visibility(self._visible | 1 << position)
 
     def reveal_all(self):
-        for index in range(len(self)):
-            self.make_visible(index)
+        self._set_visibility((1 << len(self._cards)) - 1)
 
     def make_hidden(self, card: int):
-        if card < 0:
-            card = len(self) + card
-        if card in self._visible_cards:
-            self._visible_cards.remove(card)
+        position = self._position(card)
+        if 0 <= position < len(self._cards):
+            self._set_visibility(self._visible & ~(1 << position))
 
     def hide_all(self):
-        for index in range(len(self)):
-            self.make_hidden(index)
+        self._set_visibility(0)
 
     def is_visible(self, card: int) -> bool:
-        if card < 0:
-            card = len(self) + card
-        return card in self._visible_cards
+        position = self._position(card)
+        return 0 <= position < len(self._cards) and bool(self._visible >> position & 1)
+
+    def num_visible_on_top(self) -> int:
+        hidden = ~self._visible & ((1 << len(self._cards)) - 1)
+        return len(self._cards) - hidden.bit_length()
 
     def get_last_visible_index(self) -> Optional[int]:
-        prev_card_index = None
-        for card_index in range(len(self._cards)):
-            if not self.is_visible(card_index):
-                break
-            prev_card_index = card_index
-        return prev_card_index
+        num_visible = self.num_visible_on_top()
+        return None if num_visible == 0 else num_visible - 1
 
     def get_last_visible(self) -> Optional[Card]:
         last_index = self.get_last_visible_index()
         return None if last_index is None else self[last_index]
 
+    def top(self, num_cards: int) -> 'Pile':
+        return self._slice(0, num_cards)
+
+    def split_at(self, index: int) -> Tuple['Pile', 'Pile']:
+        return self._slice(0, index), self._slice(index, len(self))
+
+    def _slice(self, start: int, stop: int) -> 'Pile':
+        # start and stop count from the top, like the public indices
+        stop = min(stop, len(self._cards))
+        if start >= stop:
+            return Pile(aces_high=self.aces_high)
+        low, high = len(self._cards) - stop, len(self._cards) - start
+        return Pile._from_ids(self._cards[low:high], (self._visible >> low) & ((1 << (high - low)) - 1),
+                              self.aces_high)
+
     def split_by_visible(self) -> Tuple['Pile', 'Pile']:
-        pile1, pile2 = Pile(aces_high=self.aces_high), Pile(aces_high=self.aces_high)
-        last_vis = self.get_last_visible_index()
-        last_vis = -1 if last_vis is None else last_vis
-        for index in range(last_vis + 1):
-            pile1 += Pile(self[index], visible=index in self._visible_cards)
-        for index in range(last_vis + 1, len(self)):
-            pile2 += Pile(self[index], visible=index in self._visible_cards)
-        return pile1, pile2
+        return self.split_at(self.num_visible_on_top())
+
+    def num_stackable_on_top(self, method: StackingMethod) -> int:
+        table = method.stack_table
+        num_visible = self.num_visible_on_top()
+        num_stackable = min(1, num_visible)
+        for position in range(len(self._cards) - 1, len(self._cards) - num_visible, -1):
+            if not table[self._cards[position]] >> self._cards[position - 1] & 1:
+                break
+            num_stackable += 1
+        return num_stackable
 
     def split_by_stackable(self, method: StackingMethod)\
             -> Tuple['Pile', 'Pile']:
-        pile1, pile2 = Pile(aces_high=self.aces_high), Pile(aces_high=self.aces_high)
-        prev_card: Optional[Card] = None
-        index = -1
-        for index in range(len(self)):
-            card = self[index]
-            if not self.is_visible(index):
-                break
-            if prev_card is None or prev_card.can_stack_on(card, method):
-                pile1 += Pile(card, visible=index in self._visible_cards)
-            else:
-                break
-            prev_card = card
-        if len(pile1) < len(self):
-            for index2 in range(index, len(self)):
-                pile2 += Pile(self[index2], visible=index2 in self._visible_cards)
-        return pile1, pile2
+        return self.split_at(self.num_stackable_on_top(method))
 
     def can_stack_on(self, card: Union[Card, 'Pile'], method: StackingMethod) -> bool:
-        prev_card = None
-        for card_index in range(len(self)):
-            curr_card = self[card_index]
-            if not self.is_visible(card_index):
-                return False
-            if prev_card is not None and not prev_card.can_stack_on(curr_card, method):
+        if card is None or (isinstance(card, Pile) and len(card) == 0):
+            target = None
+        elif isinstance(card, Pile):
+            if not card.is_visible(0):
                 return False
-            if curr_card.can_stack_on(card, method):
+            target = card._cards[-1]
+        else:
+            target = card.id
+        for position in range(len(self._cards) - 1, len(self._cards) - 1 - self.num_stackable_on_top(method), -1):
+            if method.can_stack(self._cards[position], target):
                 return True
-            prev_card = curr_card
         return False
 
     def __len__(self) -> int:
         return len(self._cards)
 
     def __getitem__(self, item: int) -> Card:
-        return self._cards[item]
+        # -1 - item maps top-first indices onto the bottom-first list, for negative indices as well
+        return CARDS[self._cards[-1 - item]]
 
     def __add__(self, other: 'Pile') -> 'Pile':
-        new_pile = Pile(aces_high=self.aces_high)
-        for index in range(len(self)):
-            new_pile._cards.append(self[index])
-            if self.is_visible(index):
-                new_pile.make_visible(index)
-        else:
-            for index in range(len(other)):
-                new_pile._cards.append(other[index])
-                if other.is_visible(index):
-                    new_pile.make_visible(index + len(self))
+        new_pile = copy.copy(other)
+        new_pile._aces_high = self.aces_high
+        new_pile.extend(self)
         return new_pile
 
     def __contains__(self, item: Card):
-        return item in self._cards
+        return item.id in self._cards
 
     def __str__(self):
         s = ""
         for index in range(len(self._cards)):
-            s += f'{self[index]}{"V" if index in self._visible_cards else "H"} '
+            s += f'{self[index]}{"V" if self.is_visible(index) else "H"} '
         return s[:-1]
 
     def __repr__(self):
         return str(self)
 
     def __copy__(self):
-        copy = Pile(start_card=self._cards, aces_high=self.aces_high)
-        for vis in self._visible_cards:
-            copy.make_visible(vis)
-        return copy
+        return Pile._from_ids(list(self._cards), self._visible, self.aces_high)
 
     def __reversed__(self) -> 'Pile':
         rev = Pile(aces_high=self.aces_high)
-        for index in range(len(self)):
-            rev = Pile(self[index], visible=index in self._visible_cards) + rev
+        copy.copy(self).reversed_into(rev)
         return rev
 
     def deal_between(self, piles: Union[int, List['Pile']], num_cards: int = None) -> List['Pile']:
@@ -353,5 +639,5 @@ class Pile:
         else:
             num_piles = len(piles)
         for card_num in range(num_cards):
-            piles[card_num % num_piles] += self.draw()
+            piles[card_num % num_piles].push(self.draw())
         return piles
@@ -0,0 +1,51 @@
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+
+class CardLocation(NamedTuple):
+    # Pile types are the same strings as in moves; depth 0 is the top card of the pile
+    pile_type: str
+    pile_index: int
+    depth: int
+
+
+class CardLocations:
+    # Shared index of where every card on a board is, kept up to date by the piles that track it. Positions are stored
+    # from the bottom of each pile, which adding or removing cards at the top never changes, along with each pile's size
+    # so a depth can be worked out at lookup
+    __slots__ = ('_places', '_sizes')
+
+    def __init__(self):
+        self._places: Dict[int, Tuple[str, int, int]] = {}
+        self._sizes: Dict[Tuple[str, int], int] = {}
+
+    def place(self, card: int, pile_type: str, pile_index: int, position: int):
+        self._places[card] = pile_type, pile_index, position
+
+    def place_all(self, cards: Iterable[int], pile_type: str, pile_index: int, start: int):
+        for position, card in enumerate(cards, start):
+            self._places[card] = pile_type, pile_index, position
+
+    def remove_all(self, cards: Iterable[int], pile_type: str, pile_index: int):
+        # Only forgets cards still recorded on the given pile, since a card can be placed on its new pile before it is
+        # taken off the old one
+        for card in cards:
+            place = self._places.get(card)
+            if place is not None and place[0] == pile_type and place[1] == pile_index:
+                del self._places[card]
+
+    def resize(self, pile_type: str, pile_index: int, size: int):
+        self._sizes[pile_type, pile_index] = size
+
+    def locate(self, card: int) -> Optional[CardLocation]:
+        # None for a card that is not on a tracked pile, such as one that has been picked up
+        place = self._places.get(card)
+        if place is None:
+            return None
+        pile_type, pile_index, position = place
+        return CardLocation(pile_type, pile_index, self._sizes[pile_type, pile_index] - 1 - position)
+
+    def __getstate__(self):
+        return self._places, self._sizes
+
+    def __setstate__(self, state):
+        self._places, self._sizes = state
@@ -3,6 +3,25 @@ from typing import *
 
 from src.model.board import *
 from src.model.deck import *
+from src.model.locations import CardLocation, CardLocations
+from src.model.zobrist import ZobristHash
+
+
+class Move(NamedTuple):
+    # Pile types are the same strings the UI methods use: 'draw', 'tableau', 'foundation' and 'deck'
+    source: str
+    source_index: int
+    dest: str
+    dest_index: int
+    num_cards: int = 1
+
+
+class UndoToken(NamedTuple):
+    move: Move
+    # Tableau piles whose top card the move turned face up
+    flipped: Tuple[int, ...] = ()
+    # Number of cards a deal moved onto the waste, or 0 if it turned the waste back over
+    num_dealt: int = 0
 
 
 class GameModel(ABC):
@@ -12,8 +31,8 @@ class GameModel(ABC):
         self.selected: Optional[Tuple[Pile, str, int]] = None
         self.stacking_method = stacking_method
 
-    def setup(self):
-        self.deck = Pile(start_full=True, shuffled=True)
+    def setup(self, rng: Shuffler = None):
+        self.deck = Pile(start_full=True, shuffled=True, rng=rng)
 
     @abstractmethod
     def pickup(self, pile_type: str, pile_index: int = 0) -> bool:
@@ -43,18 +62,233 @@ class GameModel(ABC):
 
 
 class KlondikeModel(GameModel):
-    def __init__(self):
-        super().__init__(StackingMethod(1, SuitStackMethod.ALTERNATING, stack_on_blank=lambda c: c.rank == Rank.KING))
+    def __init__(self, rng: Shuffler = None):
+        super().__init__(StackingMethod(1, SuitStackMethod.ALTERNATING, stack_on_blank={Rank.KING}))
         self.foundation = Foundation(Rank.ACE_LOW)
         self.tableau = Tableau(self.stacking_method, (1, 2, 3, 4, 5, 6, 7))
         self.draw_pile = DrawPile(self.deck)
-        self.setup()
+        self._zobrist = ZobristHash()
+        self._locations = CardLocations()
+        self._move_cache: Dict[Tuple[str, int, str, int], List[Move]] = {}
+        self._pile_keys: List[Tuple[str, int]] = []
+        self._summary_versions: Dict[Tuple[str, int], int] = {}
+        self._movable: Dict[Tuple[str, int], List[int]] = {}
+        self._targets: Dict[int, Optional[int]] = {}
+        self._foundation_for: Dict[int, int] = {}
+        self.setup(rng)
 
-    def setup(self):
-        super().setup()
+    def setup(self, rng: Shuffler = None):
+        super().setup(rng)
         self.foundation.setup()
         self.tableau.setup(self.deck)
         self.draw_pile.setup(self.deck)
+        self._zobrist = ZobristHash()
+        self.tableau.track_zobrist(self._zobrist, 0)
+        self.foundation.track_zobrist(self._zobrist, self.tableau.num_piles)
+        self.draw_pile.track_zobrist(self._zobrist, self.tableau.num_piles + len(self.foundation),
+                                     self.tableau.num_piles + len(self.foundation) + 1)
+        self._locations = CardLocations()
+        self.tableau.track_locations(self._locations)
+        self.foundation.track_locations(self._locations)
+        self.draw_pile.track_locations(self._locations)
+        self.invalidate()
+
+    def invalidate(self):
+        # Forgets every cached move, for when the piles have been changed behind the model's back
+        self.foundation.reindex()
+        self._move_cache = {}
+        self._summary_versions = {}
+        self._foundation_for = {}
+        for source, source_index, dest, dest_index in self._move_pairs():
+            self._move_cache[source, source_index, dest, dest_index] = []
+        self._pile_keys = list(dict.fromkeys(key[:2] for key in self._move_cache))
+
+    def __setstate__(self, state):
+        # The cached moves are keyed on pile versions from the process the model was pickled in
+        self.__dict__.update(state)
+        self.invalidate()
+
+    @property
+    def zobrist_hash(self) -> int:
+        # 64 bit hash of the position (card placement, face up tableau cards and the stock/waste split), kept up to date
+        # by the piles themselves as they change
+        return self._zobrist.value
+
+    def locate(self, card: Union[Card, int]) -> Optional[CardLocation]:
+        # Which pile a card is on and how many cards lie on top of it, or None while it is picked up
+        return self._locations.locate(card if isinstance(card, int) else card.id)
+
+    def pile_version(self, pile_type: str, pile_index: int = 0) -> int:
+        # Changes whenever the pile does, so callers can cache anything derived from it. The stock counts as part of the
+        # waste, and since which foundation a card goes to depends on all of them, the foundations share one version
+        if pile_type == 'tableau':
+            return self.tableau.version(pile_index)
+        elif pile_type == 'foundation':
+            return self.foundation.version
+        elif pile_type in ('draw', 'deck'):
+            return self.draw_pile.version
+        raise ValueError(f'Unrecognized pile type: {pile_type}')
+
+    def _move_pairs(self) -> Iterator[Tuple[str, int, str, int]]:
+        # Every source/destination pair that can hold a move; a foundation destination index of -1 means whichever
+        # foundation accepts the card
+        sources = [('tableau', index) for index in range(self.tableau.num_piles)] + [('draw', 0)]\
+            + [('foundation', index) for index in range(len(self.foundation))]
+        for source, source_index in sources:
+            for dest_index in range(self.tableau.num_piles):
+                if source != 'tableau' or source_index != dest_index:
+                    yield source, source_index, 'tableau', dest_index
+            if source != 'foundation':
+                yield source, source_index, 'foundation', -1
+
+    def legal_moves(self) -> List[Move]:
+        dirty = set()
+        for pile_key in self._pile_keys:
+            version = self.pile_version(*pile_key)
+            if self._summary_versions.get(pile_key) != version:
+                self._summary_versions[pile_key] = version
+                self._update_pile_summary(*pile_key)
+                dirty.add(pile_key)
+        if len(dirty) > 0:
+            for key in self._move_cache:
+                source, source_index, dest, dest_index = key
+                if (source, source_index) in dirty or (dest, max(dest_index, 0)) in dirty:
+                    self._move_cache[key] = self._find_moves(*key)
+        moves = [move for pair_moves in self._move_cache.values() for move in pair_moves]
+        if self.draw_pile.deck_length > 0 or self.draw_pile.num_visible > 0:
+            moves.append(Move('deck', 0, 'draw', 0, min(self.draw_pile.flip_amount, self.draw_pile.deck_length)))
+        return moves
+
+    def _update_pile_summary(self, pile_type: str, pile_index: int):
+        # Caches the ids of the cards that can be moved off a pile (top first) and, for tableau piles, the card that
+        # can be built on: None when the pile is empty and -1 when its top card is face down
+        if pile_type == 'tableau':
+            pile = self.tableau.peek_all(pile_index)
+            ids = pile.card_ids
+            run = pile.num_stackable_on_top(self.stacking_method)
+            self._movable[pile_type, pile_index] = ids[len(ids) - run:][::-1]
+            if len(ids) == 0:
+                self._targets[pile_index] = None
+            else:
+                self._targets[pile_index] = ids[-1] if pile.is_visible(0) else -1
+        elif pile_type == 'draw':
+            card = self.draw_pile.peek_card()
+            self._movable[pile_type, pile_index] = [] if card is None else [card.id]
+        elif pile_type == 'foundation':
+            card = self.foundation.peek(pile_index)
+            self._movable[pile_type, pile_index] = [] if card is None else [card.id]
+            self._foundation_for = {}
+
+    def can_play_from_stock(self) -> bool:
+        # Whether any stock or waste card fits on a tableau or foundation pile as they stand. If none does, dealing
+        # alone can never lead to another move. Face down tops and every foundation count, so this only errs towards True
+        tableau_tops, tableau_blank = 0, False
+        for pile_index in range(self.tableau.num_piles):
+            ids = self.tableau.peek_all(pile_index).card_ids
+            if len(ids) == 0:
+                tableau_blank = True
+            else:
+                tableau_tops |= 1 << ids[-1]
+        foundation_tops, foundation_blank = 0, False
+        for pile_index in range(len(self.foundation)):
+            ids = self.foundation[pile_index].card_ids
+            if len(ids) == 0:
+                foundation_blank = True
+            else:
+                foundation_tops |= 1 << ids[-1]
+        tableau_method, foundation_method = self.stacking_method, self.foundation.stacking_method
+        for cards in self.draw_pile.card_ids:
+            for card in cards:
+                if tableau_method.stack_table[card] & tableau_tops or foundation_method.stack_table[card] & foundation_tops\
+                        or (tableau_blank and tableau_method.blank_table[card])\
+                        or (foundation_blank and foundation_method.blank_table[card]):
+                    return True
+        return False
+
+    def _foundation_index(self, card: int) -> int:
+        # The foundation a card would go to, or -1 if it cannot go up yet
+        if card not in self._foundation_for:
+            foundation = self.foundation.find_foundation(CARDS[card])
+            can_add = self.foundation.can_add_card(CARDS[card], foundation)
+            self._foundation_for[card] = foundation if can_add else -1
+        return self._foundation_for[card]
+
+    def _find_moves(self, source: str, source_index: int, dest: str, dest_index: int) -> List[Move]:
+        movable = self._movable[source, source_index]
+        if len(movable) == 0:
+            return []
+        if dest == 'foundation':
+            foundation = self._foundation_index(movable[0])
+            return [] if foundation < 0 else [Move(source, source_index, dest, foundation)]
+        target = self._targets[dest_index]
+        if target == -1:
+            return []
+        can_stack = self.stacking_method.can_stack
+        for num_cards in range(1, len(movable) + 1):
+            if can_stack(movable[num_cards - 1], target):
+                return [Move(source, source_index, dest, dest_index, num_cards)]
+        return []
+
+    def _top_card(self, pile_type: str, pile_index: int) -> Optional[Card]:
+        if pile_type == 'tableau':
+            pile = self.tableau[pile_index]
+            return pile[0] if len(pile) > 0 else None
+        elif pile_type == 'draw':
+            return self.draw_pile.peek_card()
+        elif pile_type == 'foundation':
+            return self.foundation.peek(pile_index)
+        raise ValueError(f'Unrecognized pile type: {pile_type}')
+
+    def apply(self, move: Move) -> UndoToken:
+        if move.source == 'deck':
+            num_dealt = self.draw_pile.deal()
+            return UndoToken(move, num_dealt=num_dealt)
+        if move.dest == 'foundation':
+            # Checked before anything is taken off the source, so a move the foundation turns down loses no cards
+            card = self._top_card(move.source, move.source_index)
+            if card is None or move.num_cards != 1 or not self.foundation.can_add_card(card, move.dest_index):
+                raise ValueError(f'Cannot move {move.num_cards} card(s) from {move.source} {move.source_index} onto '
+                                 f'foundation {move.dest_index}')
+            if move.dest_index == -1:
+                # The token records which foundation the card went to, so undo takes it back off the right one
+                move = move._replace(dest_index=self.foundation.find_foundation(card))
+        if move.source == 'tableau':
+            pile = self.tableau.peek_all(move.source_index).take_top(move.num_cards)
+        elif move.source == 'draw':
+            pile = Pile(self.draw_pile.pop(), visible=True)
+        elif move.source == 'foundation':
+            pile = Pile(self.foundation.pop(move.source_index), visible=True)
+        else:
+            raise ValueError(f'Unrecognized pile type: {move.source}')
+        if move.dest == 'tableau':
+            self.tableau.replace(pile, move.dest_index)
+        elif move.dest == 'foundation':
+            self.foundation.add_card(pile[0], move.dest_index)
+        else:
+            raise ValueError(f'Cannot move cards onto pile type: {move.dest}')
+        hidden = [index for index in range(self.tableau.num_piles)
+                  if self.tableau.pile_len(index) > 0 and not self.tableau[index].is_visible(0)]
+        self.tableau.show_top_cards()
+        flipped = tuple(index for index in hidden if self.tableau[index].is_visible(0))
+        return UndoToken(move, flipped)
+
+    def undo(self, token: UndoToken):
+        move = token.move
+        if move.source == 'deck':
+            self.draw_pile.undeal(token.num_dealt)
+            return
+        for index in token.flipped:
+            self.tableau[index].make_hidden(0)
+        if move.dest == 'tableau':
+            pile = self.tableau[move.dest_index].take_top(move.num_cards)
+        else:
+            pile = Pile(self.foundation.pop(move.dest_index), visible=True)
+        if move.source == 'tableau':
+            self.tableau[move.source_index].extend(pile)
+        elif move.source == 'draw':
+            self.draw_pile.replace(pile)
+        else:
+            self.foundation.add_card(pile[0], move.source_index)
 
     def pickup(self, pile_type: str, pile_index: int = 0) -> bool:
         if self.selected is not None:
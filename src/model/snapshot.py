@@ -0,0 +1,148 @@
+import mmap
+import os
+from typing import Iterator, Optional
+
+import numpy as np
+
+from src.model.deals import DECK_SIZE
+from src.model.deck import CARD_RANK_VALUES, Rank
+from src.model.models import KlondikeModel
+
+# Record layout, 64 bytes:
+#   0       format version
+#   1-52    ids of the cards not on a foundation: tableau piles, then stock, then waste, each bottom first, padded
+#   53-59   per tableau pile, length << 3 | number of face down cards
+#   60      stock length (the top three bits are spare)
+#   61-63   per foundation, six bits of top card id + 1 (0 when empty)
+SNAPSHOT_SIZE = 64
+SNAPSHOT_VERSION = 2
+
+_PAD = 0xFF
+_CARDS_START = 1
+_TABLEAU_START = _CARDS_START + DECK_SIZE
+_NUM_TABLEAU = 7
+_STOCK = _TABLEAU_START + _NUM_TABLEAU
+_FOUNDATIONS_START = _STOCK + 1
+_NUM_FOUNDATIONS = 4
+
+
+def pack_state(model: KlondikeModel) -> bytes:
+    record = bytearray(SNAPSHOT_SIZE)
+    record[0] = SNAPSHOT_VERSION
+    cards = []
+    for pile_index in range(_NUM_TABLEAU):
+        pile = model.tableau[pile_index]
+        num_face_down = len(pile) - pile.num_visible_on_top()
+        if len(pile) >= 32 or num_face_down >= 8:
+            raise ValueError(f'Tableau pile {pile_index} does not fit in a snapshot')
+        record[_TABLEAU_START + pile_index] = len(pile) << 3 | num_face_down
+        cards.extend(pile.card_ids)
+    stock, waste = model.draw_pile.card_ids
+    record[_STOCK] = len(stock)
+    cards.extend(stock)
+    cards.extend(waste)
+    record[_CARDS_START:_CARDS_START + len(cards)] = bytes(cards)
+    record[_CARDS_START + len(cards):_TABLEAU_START] = bytes([_PAD]) * (DECK_SIZE - len(cards))
+    foundations = 0
+    for index in range(_NUM_FOUNDATIONS):
+        card_ids = model.foundation[index].card_ids
+        foundations |= (0 if len(card_ids) == 0 else card_ids[-1] + 1) << 6 * index
+    record[_FOUNDATIONS_START:] = foundations.to_bytes(3, 'little')
+    return bytes(record)
+
+
+def unpack_state(record: bytes, model: Optional[KlondikeModel] = None) -> KlondikeModel:
+    # Loads the record into model (a new one if not given) in place, so a search can reuse one model throughout
+    if len(record) != SNAPSHOT_SIZE or record[0] != SNAPSHOT_VERSION:
+        raise ValueError('Not a version {} snapshot'.format(SNAPSHOT_VERSION))
+    if model is None:
+        model = KlondikeModel(0)
+    foundations = int.from_bytes(record[_FOUNDATIONS_START:], 'little')
+    num_on_foundations = 0
+    for index in range(_NUM_FOUNDATIONS):
+        top = (foundations >> 6 * index & 0x3F) - 1
+        if top < 0:
+            model.foundation[index].load([])
+        else:
+            first = top - (CARD_RANK_VALUES[top] - Rank.ACE_LOW.rank)
+            model.foundation[index].load(range(first, top + 1), -1)
+            num_on_foundations += top - first + 1
+    position = _CARDS_START
+    for pile_index in range(_NUM_TABLEAU):
+        length, num_face_down = record[_TABLEAU_START + pile_index] >> 3, record[_TABLEAU_START + pile_index] & 7
+        model.tableau[pile_index].load(record[position:position + length], -1 << num_face_down)
+        position += length
+    stock_length = record[_STOCK] & 0x1F
+    end = _CARDS_START + DECK_SIZE - num_on_foundations
+    model.draw_pile.load(record[position:position + stock_length], record[position + stock_length:end])
+    # Piles the record leaves as they were keep their versions, so the model's version keyed caches stay good and only
+    # the foundations' suit index has to be rebuilt
+    model.foundation.reindex()
+    return model
+
+
+class SnapshotStore:
+    # Append-only file of fixed size snapshot records, read through a memory map so single records (or a numpy view
+    # of all of them) can be had without loading the file
+    def __init__(self, path: str):
+        self._path = path
+        self._file = open(path, 'ab+')
+        self._map: Optional[mmap.mmap] = None
+        self._num_mapped = 0
+
+    def __len__(self) -> int:
+        return os.fstat(self._file.fileno()).st_size // SNAPSHOT_SIZE
+
+    def append(self, record: bytes) -> int:
+        if len(record) != SNAPSHOT_SIZE:
+            raise ValueError(f'Snapshots are {SNAPSHOT_SIZE} bytes, not {len(record)}')
+        index = len(self)
+        self._file.write(record)
+        self._file.flush()
+        return index
+
+    def append_state(self, model: KlondikeModel) -> int:
+        return self.append(pack_state(model))
+
+    def _mapped(self, num_records: int) -> mmap.mmap:
+        if self._map is None or self._num_mapped < num_records:
+            if self._map is not None:
+                self._map.close()
+            self._num_mapped = len(self)
+            self._map = mmap.mmap(self._file.fileno(), self._num_mapped * SNAPSHOT_SIZE, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __getitem__(self, index: int) -> bytes:
+        num_records = len(self)
+        if index < 0:
+            index += num_records
+        if not 0 <= index < num_records:
+            raise IndexError('Snapshot index out of range')
+        start = index * SNAPSHOT_SIZE
+        return self._mapped(index + 1)[start:start + SNAPSHOT_SIZE]
+
+    def __iter__(self) -> Iterator[bytes]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def records(self) -> np.ndarray:
+        # Read only (num_records, SNAPSHOT_SIZE) memory mapped view of the file as it was when called
+        num_records = len(self)
+        if num_records == 0:
+            return np.empty((0, SNAPSHOT_SIZE), dtype=np.uint8)
+        return np.memmap(self._path, dtype=np.uint8, mode='r', shape=(num_records, SNAPSHOT_SIZE))
+
+    def load(self, index: int, model: Optional[KlondikeModel] = None) -> KlondikeModel:
+        return unpack_state(self[index], model)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> 'SnapshotStore':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
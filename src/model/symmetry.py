@@ -0,0 +1,69 @@
+import hashlib
+from typing import List
+
+from src.model.deals import DECK_SIZE
+from src.model.deck import Suit, NUM_CARD_IDS
+from src.model.models import KlondikeModel
+
+# Counts are written as bytes above the card ids, so one translation table can relabel the cards of a whole state
+_COUNT_BASE = NUM_CARD_IDS
+_RANKS_PER_SUIT = DECK_SIZE // len(Suit)
+
+
+def _suit_swap_table(suit_map: List[int]) -> bytes:
+    table = list(range(256))
+    for suit, mapped in enumerate(suit_map):
+        for rank in range(_RANKS_PER_SUIT):
+            table[suit * _RANKS_PER_SUIT + rank] = mapped * _RANKS_PER_SUIT + rank
+        table[DECK_SIZE + suit] = DECK_SIZE + mapped
+    return bytes(table)
+
+
+def _suit_symmetries() -> List[bytes]:
+    # Swapping the two black suits, the two red suits, or both gives a position that plays out exactly the same
+    suits = list(Suit)
+    black = [index for index, suit in enumerate(suits) if suit.is_black]
+    red = [index for index, suit in enumerate(suits) if not suit.is_black]
+    tables = []
+    for swap_black in (False, True):
+        for swap_red in (False, True):
+            suit_map = list(range(len(suits)))
+            if swap_black:
+                suit_map[black[0]], suit_map[black[1]] = black[1], black[0]
+            if swap_red:
+                suit_map[red[0]], suit_map[red[1]] = red[1], red[0]
+            tables.append(_suit_swap_table(suit_map))
+    return tables
+
+
+SUIT_SYMMETRIES = _suit_symmetries()
+
+
+def _pile_bytes(card_ids: List[int], out: bytearray):
+    out.append(_COUNT_BASE + len(card_ids))
+    out.extend(card_ids)
+
+
+def canonical_state(model: KlondikeModel) -> bytes:
+    # The board with foundation order and suit relabelling normalised away: the smallest encoding over the suit
+    # symmetries, with the foundations sorted so it does not matter which pile holds which suit
+    board = bytearray()
+    for pile_index in range(model.tableau.num_piles):
+        pile = model.tableau[pile_index]
+        board.append(_COUNT_BASE + len(pile) - pile.num_visible_on_top())
+        _pile_bytes(pile.card_ids, board)
+    for card_ids in model.draw_pile.card_ids:
+        _pile_bytes(card_ids, board)
+    board = bytes(board)
+    foundations = []
+    for index in range(len(model.foundation)):
+        pile = bytearray()
+        _pile_bytes(model.foundation[index].card_ids, pile)
+        foundations.append(bytes(pile))
+    return min(board.translate(table) + b''.join(sorted(pile.translate(table) for pile in foundations))
+               for table in SUIT_SYMMETRIES)
+
+
+def canonical_key(model: KlondikeModel) -> int:
+    # 64 bit key of the canonical state, the same in every process
+    return int.from_bytes(hashlib.blake2b(canonical_state(model), digest_size=8).digest(), 'little')
@@ -0,0 +1,28 @@
+from typing import List
+
+import numpy as np
+
+from src.model.deals import mix64_array
+
+# Piles are hashed by slot (which pile on the board), position from the bottom and card id
+NUM_ZOBRIST_SLOTS = 16
+NUM_ZOBRIST_POSITIONS = 56
+
+
+def zobrist_keys(count: int, stream: int) -> List[int]:
+    # Fixed keys rather than random ones, so hashes are the same in every process and every run
+    return mix64_array(np.arange(count, dtype=np.uint64) + np.uint64(stream << 40)).tolist()
+
+
+class ZobristHash:
+    # Shared accumulator that every tracked pile on a board XORs its changes into
+    __slots__ = ('value',)
+
+    def __init__(self, value: int = 0):
+        self.value = value
+
+    def __getstate__(self):
+        return self.value
+
+    def __setstate__(self, state):
+        self.value = state
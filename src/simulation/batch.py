@@ -0,0 +1,60 @@
+import math
+import multiprocessing
+from typing import NamedTuple, Optional, Union, List
+
+import numpy as np
+
+from src.model.deals import deal_permutations
+from src.model.models import KlondikeModel
+from src.simulation.headless import play_klondike
+
+
+class BatchResults(NamedTuple):
+    seeds: np.ndarray
+    num_cards: np.ndarray
+    num_moves: np.ndarray
+
+    @property
+    def num_games(self) -> int:
+        return len(self.seeds)
+
+    @property
+    def num_wins(self) -> int:
+        return int(np.count_nonzero(self.num_cards == 52))
+
+
+def _run_shard(seeds: range) -> BatchResults:
+    num_cards = np.empty(len(seeds))
+    num_moves = np.empty(len(seeds), dtype=np.int64)
+    deals = deal_permutations(seeds)
+    for index in range(len(seeds)):
+        result = play_klondike(KlondikeModel(deals[index]))
+        num_cards[index] = result.num_cards
+        num_moves[index] = result.num_moves
+    return BatchResults(np.arange(seeds.start, seeds.stop, seeds.step), num_cards, num_moves)
+
+
+def shard_seeds(seeds: range, num_shards: int) -> List[range]:
+    shard_len = max(1, math.ceil(len(seeds) / max(1, num_shards)))
+    return [seeds[start:start + shard_len] for start in range(0, len(seeds), shard_len)]
+
+
+def merge_results(shards: List[BatchResults]) -> BatchResults:
+    if len(shards) == 0:
+        return BatchResults(np.array([], dtype=np.int64), np.array([]), np.array([], dtype=np.int64))
+    return BatchResults(*(np.concatenate(field) for field in zip(*shards)))
+
+
+def run_batch(seeds: Union[int, range], num_workers: Optional[int] = None,
+              shards_per_worker: int = 4) -> BatchResults:
+    if isinstance(seeds, int):
+        seeds = range(seeds)
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    num_workers = max(1, min(num_workers, len(seeds)))
+    # Every game is dealt from its own seed, so splitting the range differently never changes a result
+    shards = shard_seeds(seeds, num_workers * shards_per_worker)
+    if num_workers == 1:
+        return merge_results([_run_shard(shard) for shard in shards])
+    with multiprocessing.Pool(num_workers) as pool:
+        return merge_results(pool.map(_run_shard, shards))
@@ -0,0 +1,48 @@
+from typing import NamedTuple, Optional
+
+from src.interaction.ai import AIController, KlondikeAIController
+from src.model.models import GameModel, KlondikeModel
+
+
+class GameResult(NamedTuple):
+    num_cards: int
+    won: bool
+    num_moves: int
+
+
+class HeadlessSimulation:
+    def __init__(self, model: GameModel, controller: AIController, max_moves: Optional[int] = None):
+        self._model = model
+        self._controller = controller
+        self._max_moves = max_moves
+        self._num_moves = 0
+
+    @property
+    def num_moves(self) -> int:
+        return self._num_moves
+
+    def step(self) -> bool:
+        if self._model.is_done():
+            return False
+        if self._max_moves is not None and self._num_moves >= self._max_moves:
+            self._model.running = False
+            return False
+        moved = self._controller.step()
+        if moved:
+            self._num_moves += 1
+        return moved
+
+    def run(self) -> int:
+        while self.step():
+            pass
+        return self._num_moves
+
+
+def play_klondike(model: Optional[KlondikeModel] = None, max_moves: Optional[int] = None) -> GameResult:
+    if model is None:
+        model = KlondikeModel()
+    controller = KlondikeAIController(model, verbose=False)
+    num_moves = HeadlessSimulation(model, controller, max_moves).run()
+    result = GameResult(model.foundation.num_cards(), model.has_won(), num_moves)
+    model.teardown()
+    return result
@@ -0,0 +1,137 @@
+import multiprocessing
+import time
+from typing import List, Optional, Sequence, Tuple, Union
+
+from src.model.models import KlondikeModel, Move
+from src.model.symmetry import canonical_key
+from src.solver.search import KlondikeSolver, SolveResult, SolveStatus
+
+Deal = Union[int, Sequence[int]]
+
+_EMPTY = 0
+_MAX_PROBES = 64
+
+
+class SharedPositionSet:
+    # Open addressing hash set of 64 bit position keys in shared memory, so every worker process can see the
+    # positions the others have proven dead. Lookups take no lock; a slot only ever goes from empty to a full key
+    def __init__(self, capacity: int = 1 << 22):
+        self._capacity = 1 << max(0, capacity - 1).bit_length()
+        self._slots = multiprocessing.RawArray('Q', self._capacity)
+        self._size = multiprocessing.RawValue('q', 0)
+        self._lock = multiprocessing.Lock()
+
+    def _probe(self, key: int) -> int:
+        # Returns the slot holding the key or the empty slot it would go in, or -1 if the probe run is full
+        key = key or 1  # 0 marks an empty slot
+        mask = self._capacity - 1
+        index = key & mask
+        for _ in range(_MAX_PROBES):
+            slot = self._slots[index]
+            if slot == key or slot == _EMPTY:
+                return index
+            index = (index + 1) & mask
+        return -1
+
+    def __contains__(self, key: int) -> bool:
+        index = self._probe(key)
+        return index >= 0 and self._slots[index] == (key or 1)
+
+    def add(self, key: int):
+        with self._lock:
+            index = self._probe(key)
+            # Once a neighbourhood is full new positions are dropped, which only costs repeated work
+            if index >= 0 and self._slots[index] == _EMPTY:
+                self._slots[index] = key or 1
+                self._size.value += 1
+
+    def __len__(self) -> int:
+        return self._size.value
+
+
+_worker_dead: Optional[SharedPositionSet] = None
+_worker_cancel = None
+
+
+def _init_worker(dead: SharedPositionSet, cancel):
+    global _worker_dead, _worker_cancel
+    _worker_dead = dead
+    _worker_cancel = cancel
+
+
+def _solve_subtree(task: Tuple[Deal, List[Move], Optional[int], Optional[float], int]) -> Tuple[List[Move], SolveResult]:
+    deal, prefix, max_nodes, deadline, table_size = task
+    if _worker_cancel.is_set():
+        return prefix, SolveResult(SolveStatus.UNKNOWN, [], 0, 0.0)
+    model = KlondikeModel(deal)
+    for move in prefix:
+        model.apply(move)
+    max_time = None if deadline is None else max(0.0, deadline - time.time())
+    solver = KlondikeSolver(model, max_nodes, max_time, table_size, dead=_worker_dead, cancel=_worker_cancel)
+    result = solver.solve()
+    if result.status == SolveStatus.SOLVABLE:
+        _worker_cancel.set()
+    return prefix, result
+
+
+def split_root(model: KlondikeModel, depth: int) -> List[List[Move]]:
+    # Move sequences (including the safe foundation moves played after each one) for every distinct position
+    # `depth` choices below the current one; a won position comes back on its own
+    solver = KlondikeSolver(model)
+    seen = set()
+    prefixes = []
+
+    def expand(prefix: List[Move], remaining: int):
+        tokens = []
+        autoplay = solver.safe_move()
+        while autoplay is not None:
+            tokens.append(model.apply(autoplay))
+            prefix = prefix + [autoplay]
+            autoplay = solver.safe_move()
+        key = canonical_key(model)
+        if key not in seen:
+            seen.add(key)
+            moves = solver.ordered_moves() if remaining > 0 and not model.has_won() else []
+            if len(moves) == 0:
+                prefixes.append(prefix)
+            for move in moves:
+                tokens.append(model.apply(move))
+                expand(prefix + [move], remaining - 1)
+                model.undo(tokens.pop())
+        while len(tokens) > 0:
+            model.undo(tokens.pop())
+
+    expand([], depth)
+    return prefixes
+
+
+def solve_parallel(deal: Deal, num_workers: Optional[int] = None, split_depth: int = 2,
+                   max_nodes: Optional[int] = None, max_time: Optional[float] = None,
+                   table_size: int = 1_000_000, shared_size: int = 1 << 22) -> SolveResult:
+    # Searches the subtrees below the first few moves of a deal in separate processes. `max_nodes` applies to
+    # each subtree, `max_time` to the whole search
+    start = time.perf_counter()
+    deadline = None if max_time is None else time.time() + max_time
+    model = KlondikeModel(deal)
+    prefixes = split_root(model, split_depth)
+    model.teardown()
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    num_workers = max(1, min(num_workers, len(prefixes)))
+
+    dead = SharedPositionSet(shared_size)
+    cancel = multiprocessing.Event()
+    tasks = [(deal, prefix, max_nodes, deadline, table_size) for prefix in prefixes]
+    nodes = 0
+    status = SolveStatus.UNSOLVABLE
+    moves: List[Move] = []
+    with multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(dead, cancel)) as pool:
+        for prefix, result in pool.imap_unordered(_solve_subtree, tasks):
+            nodes += result.nodes
+            if result.status == SolveStatus.SOLVABLE:
+                status = SolveStatus.SOLVABLE
+                moves = prefix + result.moves
+                break
+            if result.status == SolveStatus.UNKNOWN:
+                status = SolveStatus.UNKNOWN
+    return SolveResult(status, moves, nodes, time.perf_counter() - start)
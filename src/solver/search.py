@@ -0,0 +1,242 @@
+from collections import OrderedDict
+from enum import Enum
+import time
+from typing import Callable, List, NamedTuple, Optional, Protocol
+
+from src.model.deck import CARD_SUITS, CARD_RANK_VALUES, CARD_IS_BLACK, Suit
+from src.model.models import KlondikeModel, Move, UndoToken
+from src.model.symmetry import canonical_key
+
+
+_SUIT_INDEX = {suit: index for index, suit in enumerate(Suit)}
+
+
+class SolveStatus(Enum):
+    SOLVABLE = 'solvable'
+    UNSOLVABLE = 'unsolvable'
+    UNKNOWN = 'unknown'
+
+
+class SolveResult(NamedTuple):
+    status: SolveStatus
+    moves: List[Move]
+    nodes: int
+    elapsed: float
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class TranspositionTable:
+    # Positions that have been (or are being) searched, evicting the least recently used once full
+    def __init__(self, max_size: int = 1_000_000):
+        self._max_size = max_size
+        self._keys: 'OrderedDict[int, None]' = OrderedDict()
+
+    def __contains__(self, key: int) -> bool:
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def add(self, key: int):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self._max_size:
+            self._keys.popitem(last=False)
+
+    def clear(self):
+        self._keys.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class PositionSet(Protocol):
+    def __contains__(self, key: int) -> bool: ...
+
+    def add(self, key: int): ...
+
+
+class CancelFlag(Protocol):
+    def is_set(self) -> bool: ...
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class _Frame:
+    __slots__ = ('key', 'moves', 'index', 'num_autoplayed')
+
+    def __init__(self, key: int, moves: List[Move], num_autoplayed: int):
+        self.key = key
+        self.moves = moves
+        self.index = 0
+        self.num_autoplayed = num_autoplayed
+
+
+class KlondikeSolver:
+    def __init__(self, model: KlondikeModel, max_nodes: Optional[int] = None, max_time: Optional[float] = None,
+                 table_size: int = 1_000_000, key: Optional[Callable[[KlondikeModel], int]] = None,
+                 table: Optional[TranspositionTable] = None, dead: Optional[PositionSet] = None,
+                 cancel: Optional[CancelFlag] = None):
+        self._model = model
+        self._max_nodes = max_nodes
+        self._max_time = max_time
+        self._table = TranspositionTable(table_size) if table is None else table
+        # Symmetric positions have the same outcome, so by default they share a table entry
+        self._key = canonical_key if key is None else key
+        # Positions proven to have no win, which may be shared with other searches
+        self._dead = dead
+        self._cancel = cancel
+        self._path: List[UndoToken] = []
+        self._nodes = 0
+        self._deadline: Optional[float] = None
+
+    @property
+    def table(self) -> TranspositionTable:
+        return self._table
+
+    def solve(self) -> SolveResult:
+        start = time.perf_counter()
+        self._nodes = 0
+        self._deadline = None if self._max_time is None else start + self._max_time
+        self._path = []
+        try:
+            won = self._search()
+            status = SolveStatus.SOLVABLE if won else SolveStatus.UNSOLVABLE
+        except _BudgetExceeded:
+            won = False
+            status = SolveStatus.UNKNOWN
+        moves = [token.move for token in self._path] if won else []
+        # Leave the model as it was handed to us
+        while len(self._path) > 0:
+            self._model.undo(self._path.pop())
+        return SolveResult(status, moves, self._nodes, time.perf_counter() - start)
+
+    def _search(self) -> bool:
+        root = self._enter()
+        if root is None:
+            return self._model.has_won()
+        stack = [root]
+        while len(stack) > 0:
+            frame = stack[-1]
+            if frame.index == len(frame.moves):
+                stack.pop()
+                if self._dead is not None:
+                    self._dead.add(frame.key)
+                # Undo this position's autoplays, then the move that led to it
+                for _ in range(frame.num_autoplayed + (1 if len(stack) > 0 else 0)):
+                    self._model.undo(self._path.pop())
+                continue
+            move = frame.moves[frame.index]
+            frame.index += 1
+            self._count_node()
+            self._path.append(self._model.apply(move))
+            child = self._enter()
+            if child is None:
+                if self._model.has_won():
+                    return True
+                self._model.undo(self._path.pop())
+            else:
+                stack.append(child)
+        return False
+
+    def _enter(self) -> Optional[_Frame]:
+        # Plays safe foundation moves, then returns a frame of moves to try, or None if the position is won or
+        # has already been searched
+        num_autoplayed = self._autoplay()
+        if self._model.has_won():
+            return None
+        key = self._key(self._model)
+        if key in self._table or (self._dead is not None and key in self._dead):
+            for _ in range(num_autoplayed):
+                self._model.undo(self._path.pop())
+            return None
+        self._table.add(key)
+        return _Frame(key, self.ordered_moves(), num_autoplayed)
+
+    def _autoplay(self) -> int:
+        num_autoplayed = 0
+        autoplay = self.safe_move()
+        while autoplay is not None:
+            self._path.append(self._model.apply(autoplay))
+            num_autoplayed += 1
+            autoplay = self.safe_move()
+        return num_autoplayed
+
+    def _count_node(self):
+        self._nodes += 1
+        if self._max_nodes is not None and self._nodes > self._max_nodes:
+            raise _BudgetExceeded()
+        if self._nodes % 1024 == 0:
+            if self._deadline is not None and time.perf_counter() > self._deadline:
+                raise _BudgetExceeded()
+            if self._cancel is not None and self._cancel.is_set():
+                raise _BudgetExceeded()
+
+    def _foundation_heights(self) -> List[int]:
+        heights = [0] * len(Suit)
+        for index in range(len(self._model.foundation)):
+            pile = self._model.foundation[index]
+            if len(pile) > 0:
+                heights[_SUIT_INDEX[CARD_SUITS[pile.card_ids[-1]]]] = len(pile)
+        return heights
+
+    def safe_move(self) -> Optional[Move]:
+        # A card is safe to send up once no card that could still go on it is left in play: both opposite colour
+        # cards one rank down, and the same colour cards two ranks down, are already on the foundations
+        heights = None
+        for move in self._model.legal_moves():
+            if move.dest != 'foundation' or move.source == 'foundation':
+                continue
+            card = self._move_card(move)
+            rank = CARD_RANK_VALUES[card]
+            if rank <= 2:
+                return move
+            if heights is None:
+                heights = self._foundation_heights()
+            safe = True
+            for suit_index, suit in enumerate(Suit):
+                needed = rank - 1 if suit.is_black != CARD_IS_BLACK[card] else rank - 2
+                if heights[suit_index] < needed:
+                    safe = False
+                    break
+            if safe:
+                return move
+        return None
+
+    def _move_card(self, move: Move) -> int:
+        if move.source == 'tableau':
+            return self._model.tableau[move.source_index].card_ids[-move.num_cards]
+        if move.source == 'draw':
+            return self._model.draw_pile.peek_card().id
+        return self._model.foundation.peek(move.source_index).id
+
+    def ordered_moves(self) -> List[Move]:
+        foundation, revealing, other, deals, down = [], [], [], [], []
+        for move in self._model.legal_moves():
+            if move.source == 'deck':
+                deals.append(move)
+            elif move.source == 'foundation':
+                down.append(move)
+            elif move.dest == 'foundation':
+                foundation.append(move)
+            elif move.source == 'tableau':
+                source = self._model.tableau[move.source_index]
+                if move.num_cards == len(source) and self._model.tableau.pile_len(move.dest_index) == 0:
+                    continue  # Moving a whole pile onto an empty pile changes nothing
+                if move.num_cards == len(source) or not source.is_visible(move.num_cards):
+                    revealing.append(move)
+                else:
+                    other.append(move)
+            else:
+                other.append(move)
+        return foundation + revealing + other + deals + down
+
+
+def solve(model: KlondikeModel, max_nodes: Optional[int] = None, max_time: Optional[float] = None,
+          table_size: int = 1_000_000, key: Optional[Callable[[KlondikeModel], int]] = None) -> SolveResult:
+    return KlondikeSolver(model, max_nodes, max_time, table_size, key).solve()